@@ -1,28 +1,50 @@
+import asyncio
+import contextvars
 import json
 import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import AIMessage
+from langgraph.config import get_stream_writer
 from dotenv import load_dotenv
 from state import AgentState
-from schemas import get_required_fields, get_broad_category_options, get_specific_categories_for_broad
+from schemas import get_required_fields, get_broad_category_options, render_questions
+from pricing import load_rules, quote_policy, format_quote
+from parsing import extract_quote_overrides
+from extractors import extract_locally
+from context_builder import (
+    ANALYST_CONTEXT_TOKENS, ANALYST_DIGESTS, SALES_CONTEXT_TOKENS, assemble_policy_context, digest_policy_context,
+    format_policy_context, policies_mentioned
+)
+from llm_cache import with_cache
+from resources import run_blocking, get_vectorstore, get_case_store
+from cases import CASE_NEIGHBOURS, format_cases, precedent_policies
+from prefetch import analyst_query, start_prefetch, take_prefetched
+from telemetry import TracedLLM, get_logger, span
+
+log = get_logger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Gemini 2.5 Flash
-llm = ChatGoogleGenerativeAI(
+# Initialize Gemini 2.5 Flash (behind the SQLite response cache, see llm_cache.py; every call is traced)
+llm = TracedLLM(with_cache(ChatGoogleGenerativeAI(
     model="gemini-2.0-flash-exp",
     google_api_key=os.getenv("GOOGLE_API_KEY"),
     temperature=0.7
-)
+)))
 
-# --- HELPER: ROBUST JSON PARSER ---
+# Collector questions come from schemas.FIELD_QUESTIONS; set to 1 to have the LLM reword them
+PARAPHRASE_QUESTIONS = os.getenv("PARAPHRASE_QUESTIONS", "0") == "1"
+# ANALYST_FANOUT=1: one short LLM call per recommended policy (at most FANOUT_CONCURRENCY at once),
+# then a short comparison, instead of one long answer covering every policy
+ANALYST_FANOUT = os.getenv("ANALYST_FANOUT", "0") == "1"
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "3"))
+# LEARNED_CASES=0 stops the analyst from looking up similar past cases (cases.py)
+LEARNED_CASES = os.getenv("LEARNED_CASES", "1") == "1"
 
-def load_rules():
-    if os.path.exists("policy_rules.json"):
-        with open("policy_rules.json", "r") as f:
-            return json.load(f)
-    return {}
+# --- HELPER: ROBUST JSON PARSER ---
 
 POLICY_RULES = load_rules()
 
@@ -39,6 +61,21 @@ def get_logic_for_file(filename):
 
     return None
 
+def build_quote_context(sources, collected, overrides=None):
+    # Premiums are computed by pricing.py; the LLM only gets the finished numbers to narrate
+    logic_context = ""
+    for source in sources:
+        quote = quote_policy(source, collected, overrides)
+        if quote:
+            logic_context += f"\n👉 COMPUTED QUOTE FOR '{source}':\n{format_quote(quote)}\n"
+            continue
+        rule_text = get_logic_for_file(source)
+        if rule_text:
+            logic_context += f"\n👉 PRICING RULE FOR '{source}' (no rate table, not pre-computed):\n{rule_text}\n"
+        else:
+            logic_context += f"\n❌ NO RULE FOUND FOR '{source}'. Check filename matching.\n"
+    return logic_context
+
 def clean_and_parse_json(response_text):
     
     try:
@@ -52,11 +89,11 @@ def clean_and_parse_json(response_text):
             json_str = match.group()
             return json.loads(json_str)
     except Exception as e:
-        print(f"JSON PARSING ERROR: {e} | Text: {response_text}")
+        log.error(f"JSON PARSING ERROR: {e} | Text: {response_text}")
     return {}
 
 # --- HELPER: INTENT CLASSIFIER ---
-def classify_intent_and_extract(user_text, current_category, potential_fields=None, is_confirming_category=False):
+def build_intent_prompt(user_text, current_category, potential_fields=None, is_confirming_category=False):
     
     valid_broad_cats = ", ".join(get_broad_category_options())
 
@@ -76,8 +113,7 @@ def classify_intent_and_extract(user_text, current_category, potential_fields=No
             "extracted_data": {{}}
         }}
         """
-        response = llm.invoke(prompt)
-        return clean_and_parse_json(response.content)
+        return prompt
 
     extraction_instruction = ""
     if potential_fields:
@@ -121,12 +157,86 @@ def classify_intent_and_extract(user_text, current_category, potential_fields=No
         "extracted_data": {{ "KEY": "VALUE" }}
     }}
     """
-    
+    return prompt
+
+def classify_intent_and_extract(user_text, current_category, potential_fields=None, is_confirming_category=False):
+    prompt = build_intent_prompt(user_text, current_category, potential_fields, is_confirming_category)
     response = llm.invoke(prompt)
     return clean_and_parse_json(response.content)
 
+async def aclassify_intent_and_extract(user_text, current_category, potential_fields=None, is_confirming_category=False):
+    prompt = build_intent_prompt(user_text, current_category, potential_fields, is_confirming_category)
+    response = await llm.ainvoke(prompt)
+    return clean_and_parse_json(response.content)
+
+def _fast_path(user_text, current_category, potential_fields, is_confirming_category, answering_questions, collected,
+               last_asked=None):
+    # Local regex/keyword pass first; the LLM only sees turns it could not account for
+    analysis, confident = extract_locally(
+        user_text, current_category, potential_fields, is_confirming_category, answering_questions, collected, last_asked
+    )
+    if confident:
+        log.info(f"⚡ FAST PATH: {analysis}")
+        return analysis
+    log.info("🤖 Low confidence locally, asking the LLM")
+    return None
+
+def analyze_turn(user_text, current_category, potential_fields=None, is_confirming_category=False,
+                 answering_questions=True, collected=None, last_asked=None):
+    analysis = _fast_path(
+        user_text, current_category, potential_fields, is_confirming_category, answering_questions, collected, last_asked
+    )
+    if analysis is not None:
+        return analysis
+    return classify_intent_and_extract(user_text, current_category, potential_fields, is_confirming_category)
+
+async def aanalyze_turn(user_text, current_category, potential_fields=None, is_confirming_category=False,
+                        answering_questions=True, collected=None, last_asked=None):
+    # The category classifier embeds the turn: keep it off the event loop
+    analysis = await run_blocking(
+        _fast_path, user_text, current_category, potential_fields, is_confirming_category, answering_questions, collected,
+        last_asked
+    )
+    if analysis is not None:
+        return analysis
+    return await aclassify_intent_and_extract(user_text, current_category, potential_fields, is_confirming_category)
+
+def _with_reply(result, response):
+    # Shared tail of every node that ends in one LLM call
+    content = response.content.strip() if isinstance(response.content, str) else response.content
+    if content:
+        result["messages"] = [("ai", content)]
+    return result
+
+def _stream_reply(result, prompt, node):
+    # Long write-ups: forward tokens to stream_mode="custom" consumers (app.py, /chat/stream) as they arrive
+    writer = get_stream_writer()
+    parts = []
+    for chunk in llm.stream(prompt):
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            writer({"node": node, "token": chunk.content})
+    return _with_reply(result, AIMessage(content="".join(parts)))
+
+async def _astream_reply(result, prompt, node):
+    writer = get_stream_writer()
+    parts = []
+    async for chunk in llm.astream(prompt):
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            writer({"node": node, "token": chunk.content})
+    return _with_reply(result, AIMessage(content="".join(parts)))
+
 # --- 1. ROUTER NODE (The Brain) ---
 def router_node(state: AgentState):
+    request = plan_router_turn(state)
+    return route_turn(state, analyze_turn(**request))
+
+async def arouter_node(state: AgentState):
+    request = plan_router_turn(state)
+    return route_turn(state, await aanalyze_turn(**request))
+
+def plan_router_turn(state: AgentState):
     messages = state["messages"]
     last_user_msg = messages[-1][1] if messages else ""
     current_cat = state.get("current_category")
@@ -135,25 +245,42 @@ def router_node(state: AgentState):
     last_asked = state.get("last_asked_field")
     plan_status = state.get("recommended_plan")
     
-    # Initialize if empty
-    if "collected_data" not in state:
-        state["collected_data"] = {}
-
-    print(f"🧠 ROUTER: Analyzing '{last_user_msg}' | Cat: {current_cat} (Confirmed: {is_confirmed}) | Plan: {plan_status}")
+    log.info(f"🧠 ROUTER: Analyzing '{last_user_msg}' | Cat: {current_cat} (Confirmed: {is_confirmed}) | Plan: {plan_status}")
 
     # --- SCENARIO A: We are waiting for Category Confirmation ---
     if current_cat and not is_confirmed and last_asked == "category_confirmation":
-        analysis = classify_intent_and_extract(last_user_msg, current_cat, is_confirming_category=True)
-        
+        return {"user_text": last_user_msg, "current_category": current_cat, "is_confirming_category": True}
+
+    required_fields = get_required_fields(current_cat) if current_cat else []
+    # Unanswered fields first, in the order the collector asked for them
+    potential_fields_to_extract = [f for f in required_fields if not collected.get(f)] + [f for f in required_fields if collected.get(f)]
+    return {
+        "user_text": last_user_msg,
+        "current_category": current_cat,
+        "potential_fields": potential_fields_to_extract,
+        "answering_questions": plan_status != "Done",
+        "collected": collected,
+        "last_asked": last_asked,
+    }
+
+def route_turn(state: AgentState, analysis):
+    current_cat = state.get("current_category")
+    is_confirmed = state.get("category_confirmed", False)
+    collected = state.get("collected_data") or {}
+    last_asked = state.get("last_asked_field")
+    plan_status = state.get("recommended_plan")
+
+    # --- SCENARIO A: Answer to the Category Confirmation ---
+    if current_cat and not is_confirmed and last_asked == "category_confirmation":
         if analysis.get("confirmed"):
-            print("✅ Category Confirmed!")
+            log.info("✅ Category Confirmed!")
             return {
                 "category_confirmed": True,
                 "last_asked_field": None,
                 "next_step": "router"
             }
         elif analysis.get("new_category"):
-            print(f"🔄 Correction: {current_cat} -> {analysis['new_category']}")
+            log.info(f"🔄 Correction: {current_cat} -> {analysis['new_category']}")
             return {
                 "current_category": analysis["new_category"],
                 "category_confirmed": False,
@@ -162,10 +289,6 @@ def router_node(state: AgentState):
             }
         else:
             return {"category_confirmed": True, "next_step": "router"}
-
-    potential_fields_to_extract = get_required_fields(current_cat) if current_cat else []    
-    # A. Analyze Intent
-    analysis = classify_intent_and_extract(last_user_msg, current_cat, potential_fields_to_extract)
     
     # B. Handle Category Switch
     if analysis.get("new_category") and analysis["new_category"] != current_cat:
@@ -176,6 +299,9 @@ def router_node(state: AgentState):
                 "collected_data": analysis.get("extracted_data", {}),
                 "recommended_plan": None,
                 "policy_context": None,
+                "recommended_policies": None,
+                "shown_policies": None,
+                "prefetch_key": None,
                 "next_step": "collector",
                 "last_asked_field": None
             }
@@ -187,7 +313,7 @@ def router_node(state: AgentState):
         clean_data = {k.lower(): v for k, v in new_data.items() if v}
         collected.update(clean_data)
 
-        print(f"🔥 UPDATED PROFILE: {collected}")
+        log.info(f"🔥 UPDATED PROFILE: {collected}")
     
     if not current_cat:
         return {"next_step": "collector", "collected_data": collected}
@@ -223,6 +349,15 @@ def router_node(state: AgentState):
         }
 
 def collector_node(state: AgentState):
+    result, prompt = prepare_questions(state)
+    return _with_reply(result, llm.invoke(prompt)) if prompt else result
+
+async def acollector_node(state: AgentState):
+    result, prompt = prepare_questions(state)
+    return _with_reply(result, await llm.ainvoke(prompt)) if prompt else result
+
+def prepare_questions(state: AgentState):
+    # -> (node result, optional LLM prompt whose answer replaces the message)
     current_cat = state.get("current_category")
     is_confirmed = state.get("category_confirmed", False)
     missing = state.get("missing_fields", [])
@@ -231,108 +366,221 @@ def collector_node(state: AgentState):
         return {
             "messages": [("ai", f"It sounds like you are looking for **{current_cat}** Insurance. Is that correct?")],
             "last_asked_field": "category_confirmation"
-        }
+        }, None
 
     if not current_cat:
         return {
             "messages": [("ai", "I can help with Health, Vehicle, Pet, and Property insurance. Which one are you interested in?")],
             "last_asked_field": "category"
-        }
+        }, None
 
     if missing:
-        fields_list_str = ", ".join(missing)
-        
-        question_prompt = f"""
-        You are a helpful insurance assistant. 
-        The user wants {current_cat} insurance.
-        We need to know: [{fields_list_str}].
-        
-        Task:
-        Generate a polite message asking for these details. 
-        
-        IMPORTANT FORMATTING RULES:
-        1. Start with a polite opening sentence.
-        2. Present the questions as a NUMBERED LIST.
-        3. Keep questions short and clear.
-
-        Example Output:
-        "To verify your eligibility, could you please provide:
-        1. Your Age?
-        2. Your Occupation?"
-
-        Output ONLY the question.
-        """
-        response = llm.invoke(question_prompt)
-        question = response.content.strip().replace('"', '')
-        
-        return {
+        question = render_questions(current_cat, missing)
+        result = {
             "messages": [("ai", question)],
-            "last_asked_field": "bulk_questions" 
+            "last_asked_field": "bulk_questions",
+            # Search with what we have while the user types the rest; the analyst re-ranks the candidates
+            "prefetch_key": start_prefetch(current_cat, state.get("collected_data")),
         }
+
+        paraphrase_prompt = None
+        if PARAPHRASE_QUESTIONS:
+            paraphrase_prompt = f"""
+            You are a helpful insurance assistant. 
+            Rewrite the message below so it sounds warm and natural.
+            
+            IMPORTANT FORMATTING RULES:
+            1. Keep the opening sentence and the NUMBERED LIST.
+            2. Keep every question, in the same order, with the same meaning.
+            3. Keep questions short and clear.
+
+            Message:
+            {question}
+
+            Output ONLY the rewritten message.
+            """
+        return result, paraphrase_prompt
     
-    return {}
+    return {}, None
     
 def analyst_node(state: AgentState):
-    collected = state.get("collected_data")
-    broad_category = state.get("current_category")
-    vectorstore = state.get("vectorstore")
+    result, prompt = prepare_recommendation(state)
+    if isinstance(prompt, dict):
+        return _fan_out_reply(result, prompt, "analyst")
+    return _stream_reply(result, prompt, "analyst") if prompt else result
+
+async def aanalyst_node(state: AgentState):
+    # Embedding + vector search are CPU-bound: run them on the shared worker pool, not the event loop
+    result, prompt = await run_blocking(prepare_recommendation, state)
+    if isinstance(prompt, dict):
+        return await _afan_out_reply(result, prompt, "analyst")
+    return await _astream_reply(result, prompt, "analyst") if prompt else result
+
+# --- FAN-OUT: per-policy sections in parallel, then one short comparison ---
+def _section_text(response):
+    return response.content.strip() if isinstance(response.content, str) else str(response.content)
+
+def _fan_out_reply(result, plan, node):
+    # plan: {"prompts": [per-policy prompt, ...], "compare": sections -> comparison prompt}
+    writer = get_stream_writer()
+    with span("analyst.fan_out", policies=len(plan["prompts"]), concurrency=FANOUT_CONCURRENCY):
+        with ThreadPoolExecutor(max_workers=max(1, min(FANOUT_CONCURRENCY, len(plan["prompts"])))) as pool:
+            # Each call gets its own copy of the context so its llm span nests under this node
+            futures = [pool.submit(contextvars.copy_context().run, llm.invoke, prompt) for prompt in plan["prompts"]]
+            sections = []
+            for future in futures:
+                sections.append(_section_text(future.result()))
+                writer({"node": node, "token": sections[-1] + "\n\n"})
+    parts = ["\n\n".join(sections), "\n\n"]
+    for chunk in llm.stream(plan["compare"](sections)):
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            writer({"node": node, "token": chunk.content})
+    return _with_reply(result, AIMessage(content="".join(parts)))
+
+async def _afan_out_reply(result, plan, node):
+    writer = get_stream_writer()
+    limit = asyncio.Semaphore(max(1, FANOUT_CONCURRENCY))
+
+    async def section(prompt):
+        async with limit:
+            return _section_text(await llm.ainvoke(prompt))
+
+    with span("analyst.fan_out", policies=len(plan["prompts"]), concurrency=FANOUT_CONCURRENCY):
+        tasks = [asyncio.ensure_future(section(prompt)) for prompt in plan["prompts"]]
+        sections = []
+        try:
+            # Shown in recommendation order, each as soon as it and the ones before it are done
+            for task in tasks:
+                sections.append(await task)
+                writer({"node": node, "token": sections[-1] + "\n\n"})
+        finally:
+            for task in tasks:
+                task.cancel()
+    parts = ["\n\n".join(sections), "\n\n"]
+    async for chunk in llm.astream(plan["compare"](sections)):
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            writer({"node": node, "token": chunk.content})
+    return _with_reply(result, AIMessage(content="".join(parts)))
+
+def build_policy_prompt(broad_category, collected, source, policy_text, quote_text):
+
+    return f"""
+    You are a smart Insurance Underwriter.
+
+    User Profile: {json.dumps(collected)}
+    User Category Need: {broad_category}
+
+    POLICY: {source}
+    {policy_text}
+
+    PREMIUM QUOTE (ALREADY CALCULATED - COPY THESE NUMBERS, DO NOT RECALCULATE):
+    {quote_text}
+
+    YOUR TASK (this policy only, under 150 words):
+    1. One line on who this policy suits and how it fits the profile.
+    2. Up to 3 key benefits and its main exclusion or waiting period.
+    3. Present the premium exactly as given in the quote. If it says "Cannot quote", say what is missing.
 
-    print(f"🕵️ ANALYST: Searching for {broad_category} policies matching {collected}")
+    OUTPUT FORMAT:
+    #### [Policy Name]
+    [Fit and benefits]
+    * **Inputs Used:** [Inputs Used from the quote] (State which are Assumed)
+    * **Calculation:** [Steps from the quote]
+    * **Tax:** [GST line from the quote]
+    * **Final Estimate:** ₹[Final Premium] [period from the quote]
+    """
 
-    if not vectorstore:
-        return {"messages": [("ai", "Error: No policy database loaded.")], "recommended_plan": None}
-    
-    specific_subtypes = get_specific_categories_for_broad(broad_category)
+def build_comparison_prompt(broad_category, collected, sections, past_cases=""):
 
-    query = f"{broad_category} insurance policy features coverage"
-    for key, val in collected.items():
-        query += f" {val}"
-    
-    try:
-        docs = vectorstore.similarity_search(query, k=10, filter={"category": {"$in": specific_subtypes}} if specific_subtypes else None)
-        retrieved_docs = [d.page_content for d in docs]
-    except:
-        print("⚠️ Advanced filtering failed, using broad search")
-        docs = vectorstore.similarity_search(query, k=10)
+    summaries = "\n\n".join(sections)
+    if past_cases:
+        summaries += f"\n\nWhat similar past customers chose:\n{past_cases}"
+    return f"""
+    You are a smart Insurance Underwriter.
 
-    unique_policies = {}
-    logic_context = ""
+    User Profile: {json.dumps(collected)}
+    User Category Need: {broad_category}
 
-    for doc in docs:
-        source = doc.metadata.get('source', 'Unknown')
-        doc_cat = doc.metadata.get('category', 'General')
-        if specific_subtypes and doc_cat not in specific_subtypes:
-            continue
-        if source not in unique_policies:
-            unique_policies[source] = doc.page_content
-
-            rule_text = get_logic_for_file(source)
-            if rule_text:
-                logic_context += f"\n👉 PRICING RULE FOR '{source}':\n{rule_text}\n"
-            else:
-                logic_context += f"\n❌ NO RULE FOUND FOR '{source}'. Check filename matching.\n"
+    These policy summaries were already shown to the user:
+    {summaries}
+
+    YOUR TASK: In under 80 words, compare them for this profile and say which one you recommend and why.
+    Do NOT repeat the summaries and do NOT change any premium.
+
+    Recommendation:
+    """
+
+def prepare_recommendation(state: AgentState):
+    collected = state.get("collected_data")
+    broad_category = state.get("current_category")
+    vectorstore = get_vectorstore()
+
+    log.info(f"🕵️ ANALYST: Searching for {broad_category} policies matching {collected}")
+
+    if not vectorstore:
+        return {"messages": [("ai", "Error: No policy database loaded.")], "recommended_plan": None}, None
+    
+    query = analyst_query(broad_category, collected)
+    # Non-empty when the user asked for other options: every policy already recommended is left out
+    shown = set(state.get("shown_policies") or [])
+
+    # Nearest past cases (same query embedding, one query): strong precedents lead the recommendation
+    cases = []
+    if LEARNED_CASES:
+        cases = get_case_store().nearest(vectorstore.embed_query(query), k=CASE_NEIGHBOURS, category=broad_category)
+    docs = vectorstore.fetch_policies([source for source in precedent_policies(cases) if source not in shown])
+
+    if len(docs) < 3:
+        # Candidates prefetched during collection only need re-ranking for the full profile; otherwise
+        # one query against the per-policy index of this category: up to 3 distinct policies, best first
+        candidates = take_prefetched(state.get("prefetch_key"), broad_category, vectorstore)
+        candidates = {source: candidate for source, candidate in (candidates or {}).items() if source not in shown}
+        if candidates:
+            retrieved = vectorstore.rank_candidates(query, candidates, n=3, category=broad_category)
+        else:
+            retrieved = vectorstore.search_policies(query, n=3, category=broad_category, exclude=shown)
+        precedents = {doc.metadata.get('source') for doc in docs}
+        docs = (docs + [doc for doc in retrieved if doc.metadata.get('source') not in precedents])[:3]
+    else:
+        log.info(f"📚 Strong precedents, skipping retrieval: {[doc.metadata.get('source') for doc in docs]}")
+    unique_policies = {doc.metadata.get('source', 'Unknown'): doc.page_content for doc in docs}
     
     if len(unique_policies) < 3:
-        print("⚠️ Few matches found. Expanding search for alternatives...")
+        # Only when the category itself holds fewer than 3 policies
+        log.warning("⚠️ Few matches found. Expanding search for alternatives...")
         query_broad = f"{broad_category} insurance policy features"
-        docs_broad = vectorstore.similarity_search(query_broad, k=5)
-        for doc in docs_broad:
+        for doc in vectorstore.search_policies(query_broad, n=3 + len(unique_policies), exclude=shown):
             source = doc.metadata.get('source', 'Unknown')
             if source not in unique_policies:
                 unique_policies[source] = doc.page_content
+
+    if shown and not unique_policies:
+        return {
+            "messages": [("ai", "Those are all the matching policies I have for your profile. Would you like to compare them or change any details?")],
+            "recommended_plan": "Done"
+        }, None
     
     num_found = len(unique_policies)
-    context_text = ""
-    i = 1
-    for source, content in list(unique_policies.items())[:3]:
-        context_text += f"\n--- POLICY OPTION {i}: {source} ---\n{content[:1500]}...\n"
-        i += 1
+    recommended_sources = list(unique_policies)[:3]
+    # Index-time digest per policy (or opening chunk + the chunks most relevant to this profile),
+    # within ANALYST_CONTEXT_TOKENS
+    assemble = digest_policy_context if ANALYST_DIGESTS else assemble_policy_context
+    policy_texts = assemble(vectorstore, recommended_sources, query, unique_policies, ANALYST_CONTEXT_TOKENS)
+    context_text = format_policy_context(policy_texts, recommended_sources)
+    past_cases = format_cases(cases)
+    if past_cases:
+        context_text += f"\n--- SIMILAR PAST CASES ---\n{past_cases}\n"
+    # Quoted per policy so fan-out prompts can carry just their own quote
+    quotes = {source: build_quote_context([source], collected) for source in recommended_sources}
+    logic_context = "".join(quotes.values())
     
     if num_found == 0:
         return {
             "messages": [("ai", f"I searched the database but couldn't find any {broad_category} policies. Please try a different category.")],
             "recommended_plan": "Done"
-        }
+        }, None
     
     elif num_found == 1:
         prompt = f"""
@@ -344,7 +592,7 @@ def analyst_node(state: AgentState):
         I searched the database and found ONLY ONE relevant policy:
         {context_text}
 
-        STRICT PRICING LOGIC (USE THIS EXACTLY):
+        PREMIUM QUOTE (ALREADY CALCULATED - COPY THESE NUMBERS, DO NOT RECALCULATE):
         {logic_context}
         
         YOUR TASK:
@@ -352,18 +600,26 @@ def analyst_node(state: AgentState):
         2. Recommend this policy and explain its benefits.
         3. Do NOT invent other policies to make up numbers.
         4. Mention if this policy meets the user's specific budget/needs stated in the profile.
-        5. CALCULATE the premium using the "PRICING RULE" above.
-        6. DO NOT use generic formulas. Use the specific numbers in the rule (e.g. "Rs 11,350").
-        7. If the user's age/sum insured matches a range in the rule, use that price.
-        8. If values are missing, ASSUME defaults (e.g. Age: 30, Sum Insured: 5 Lakhs) and STATE THEM.
+        5. Present the premium from the quote above exactly as given. Do NOT redo or change the math.
+        6. Clearly STATE any inputs marked "(assumed)".
+        7. If the quote says "Cannot quote", explain what is missing instead of inventing a price.
 
         ### 💰 Premium Calculation
-        * **User Profile Used:** Age: [X], SI: [Y]
-        * **Base Rate:** ₹[Insert Number] (Annual/Monthly - STATE WHICH)
-        * **Duration:** [e.g. 1 Year / 2 Years]
-        * **Tax:** +18% GST
-        * **Total Estimated Premium:** ₹[Final Amount] FOR [Duration]
+        * **User Profile Used:** [Inputs Used from the quote]
+        * **Calculation:** [Steps from the quote]
+        * **Tax:** [GST line from the quote]
+        * **Total Estimated Premium:** ₹[Final Premium] [period from the quote]
         """
+
+    elif ANALYST_FANOUT:
+        # Sections written concurrently by _fan_out_reply, then compared in one short call
+        prompt = {
+            "prompts": [
+                build_policy_prompt(broad_category, collected, source, policy_texts[source], quotes[source])
+                for source in recommended_sources
+            ],
+            "compare": lambda sections: build_comparison_prompt(broad_category, collected, sections, past_cases),
+        }
     
     else:
         prompt = f"""
@@ -375,63 +631,71 @@ def analyst_node(state: AgentState):
         I have found {len(unique_policies)} distinct policy documents:
         {context_text}
 
-        PRICING RULES (STRICT):
+        PREMIUM QUOTES (ALREADY CALCULATED - COPY THESE NUMBERS, DO NOT RECALCULATE):
         {logic_context}
         
         YOUR TASK:
         1. Recommend up to 3 DISTINCT policies.
-        2. CALCULATE PREMIUMS using the "PRICING RULES" above.
-        
-        ### 🧠 INTELLIGENT VARIABLE MAPPING (CRITICAL)
-        If the User Profile is missing exact fields, use these logical mappings:
-        - **Risk Class (Accident):** - Doctors, Office, Architects -> Use "Class 1" Rate
-        - Sales, Field, Site Work -> Use "Class 2" Rate
-        - Manual Labor, Drivers, Mechanics -> Use "Class 3" Rate
-        - **Engine CC (Vehicle):**
-        - If 'Car' & unknown CC -> Assume < 1000cc (Small Car)
-        - If 'Bike' & unknown CC -> Assume 75-150cc (Standard Bike)
-        - **Sum Insured:**
-        - If user said "Cheap" -> Use lowest SI in table.
-        - If user said "Best" -> Use highest SI in table.
-        - If unknown -> Default to 5 Lakhs (Health) or 15 Lakhs (PA).
-        - **Travel Duration:** - If unknown -> Assume "14 Days" (Standard Trip).
+        2. Present each policy's premium exactly as given in the quotes above. Do NOT redo or change the math.
+        3. If a quote says "Cannot quote", explain what is missing instead of inventing a price.
 
         ### 💰 Premium Calculation Output Format
-        For each recommended policy, you MUST show the math:
+        For each recommended policy, show the quote:
         * **Policy:** [Name]
-        * **Inputs Used:** Age: [X], SI: [Y], Class: [Z] (State if Assumed)
-        * **Base Formula:** [Show the rule you used]
-        * **Math:** [Value] x [Rate] = [Result]
-        * **Tax:** +18% GST
-        * **Final Estimate:** ₹[Total] [Per Year/Per Trip]
+        * **Inputs Used:** [Inputs Used from the quote] (State which are Assumed)
+        * **Calculation:** [Steps from the quote]
+        * **Tax:** [GST line from the quote]
+        * **Final Estimate:** ₹[Final Premium] [period from the quote]
 
         Recommendation:
         """
     
-    response = llm.invoke(prompt)
-    recommendation = response.content
-    
     return {
         "recommended_plan": "Done", 
         "policy_context": context_text,
         "logic_context": logic_context,
-        "messages": [("ai", recommendation)]
-    }
+        "recommended_policies": recommended_sources,
+        "shown_policies": sorted(shown) + recommended_sources
+    }, prompt
 
 def sales_node(state: AgentState):
+    result, prompt = prepare_sales_answer(state)
+    return _stream_reply(result, prompt, "sales") if prompt else result
+
+async def asales_node(state: AgentState):
+    result, prompt = await run_blocking(prepare_sales_answer, state)
+    return await _astream_reply(result, prompt, "sales") if prompt else result
+
+def prepare_sales_answer(state: AgentState):
     
     last_user_msg = state["messages"][-1][1]
     context = state.get("policy_context", "No specific policy context available.")
     
     logic_context = state.get("logic_context", "")
     collected = state.get("collected_data", {})
+    recommended_sources = state.get("recommended_policies") or []
     
     if "other" in last_user_msg.lower() or "different" in last_user_msg.lower():
         return {
             "messages": [("ai", "Sure, let me look for other options based on your profile...")],
             "recommended_plan": None,
             "next_step": "analyst"
-        }
+        }, None
+
+    # Only the policies the question is about ("the second one", "Arogya"), all of them otherwise
+    discussed = policies_mentioned(last_user_msg, recommended_sources) or recommended_sources
+
+    # Re-quote locally when the question changes the terms ("2 year premium", "for 30 days")
+    # or narrows the discussion down, so only those quotes/rules go into the prompt
+    overrides = extract_quote_overrides(last_user_msg)
+    if recommended_sources and (overrides or discussed != recommended_sources):
+        logic_context = build_quote_context(discussed, collected, overrides)
+
+    # Policy text for THIS question under SALES_CONTEXT_TOKENS instead of the whole analyst context
+    vectorstore = get_vectorstore()
+    if vectorstore and discussed:
+        policy_texts = assemble_policy_context(vectorstore, discussed, last_user_msg, budget=SALES_CONTEXT_TOKENS)
+        context = format_policy_context(policy_texts, discussed)
 
     prompt = f"""
     You are an insurance expert. Use ONLY the data below.
@@ -442,38 +706,21 @@ def sales_node(state: AgentState):
     USER PROFILE: {json.dumps(collected)}
     User Question: "{last_user_msg}"
 
-    AVAILABLE PRICING RULES:
+    PREMIUM QUOTES (ALREADY CALCULATED FOR THE TERMS IN THE QUESTION):
     {logic_context}
     
     Task: 
     1. Answer the user's question.
-    2. If the user asks for a price (e.g., "2 year premium"), find the rule in the text above.
-    3. LOOKUP the specific rate for their Age/Vehicle.
-    4. APPLY the duration math (e.g. Rule says: "2 Years = 2 * Base - 5%").
-    5. OUTPUT A REAL NUMBER. Do not show variables like "Base Rate * 2". Show "5000 * 2 = 10000".
-    6. If the logic text above is empty, apologize and say you cannot calculate.
-    7. CRITICAL: You MUST state if the Final Amount is "Per Year", "Per Month", or "For X Years".
+    2. If the user asks for a price, use the matching quote above. COPY its numbers; do NOT recalculate.
+    3. If a quote says "Cannot quote" or the quotes above are empty, apologize and say you cannot calculate.
+    4. CRITICAL: You MUST state the period exactly as the quote does ("per year", "for 3 years", "per trip").
 
     OUTPUT FORMAT:
     [Answer to question]
 
     ### 🧮 Premium Calculation
-    **Assumptions:** [List assumptions]
-    **Formula:** [Show the formula found in logic]
-    **Math:** [Step 1] -> [Step 2]
-    **Total Estimated Premium:** [Final Result]
-
-    Example Output:
-    "Based on the rules for [Policy Name]:
-    1. Base Annual Premium: ₹5,000 (Per Year)
-    2. Duration Selected: 2 Years
-    3. Calculation: ₹5,000 x 2 Years = ₹10,000
-    4. Discount (5%): -₹500
-    5. GST (18%): +₹1,710
-    
-    **Total Payable:** ₹11,210 (For 2 Years)"
+    **Assumptions:** [Inputs marked (assumed) in the quote]
+    **Calculation:** [Steps from the quote]
+    **Total Estimated Premium:** [Final Premium and period from the quote]
     """
-    response = llm.invoke(prompt)
-    
-
-    return {"messages": [("ai", response.content)]}
+    return {}, prompt
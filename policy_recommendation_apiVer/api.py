@@ -0,0 +1,197 @@
+# api.py
+# Async HTTP API around the compiled LangGraph workflow (the Streamlit app.py stays as the demo UI).
+# Run with: uvicorn api:api --host 0.0.0.0 --port 8000
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+import extractors
+import resources
+import telemetry
+
+log = telemetry.get_logger(__name__)
+
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "200"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(2 * 3600)))
+GREETING = "Hello! I can help you with Health, Vehicle, Pet, and Property insurance. How can I assist you today?"
+
+# --- 1. SESSIONS ---
+# Conversation state lives in the graph checkpointer (keyed by session_id as thread_id);
+# the process only keeps a lock per session so turns of one conversation never overlap.
+SESSION_LOCKS: Dict[str, Dict[str, Any]] = {}
+_turn_slots = None
+_graph = None
+
+def get_session_lock(session_id):
+    now = time.time()
+    for sid in [sid for sid, s in SESSION_LOCKS.items() if now - s["last_seen"] > SESSION_TTL_SECONDS and not s["lock"].locked()]:
+        del SESSION_LOCKS[sid]
+    session = SESSION_LOCKS.setdefault(session_id, {"lock": asyncio.Lock(), "last_seen": now})
+    session["last_seen"] = now
+    return session["lock"]
+
+def last_reply(result):
+    last_msg = result["messages"][-1]
+    if isinstance(last_msg, (tuple, list)):
+        role, content = last_msg
+    else:
+        role = getattr(last_msg, "type", "unknown")
+        content = getattr(last_msg, "content", str(last_msg))
+    if role != "ai":
+        content = "I'm not sure how to respond to that. Could you rephrase?"
+    return content
+
+def turn_summary(session_id, result, reply):
+    return {
+        "session_id": session_id,
+        "reply": reply,
+        "category": result.get("current_category"),
+        "category_confirmed": result.get("category_confirmed", False),
+        "waiting_for": result.get("last_asked_field"),
+        "collected_data": result.get("collected_data") or {},
+    }
+
+async def rollback_turn(session_id, before):
+    # LangGraph checkpoints after every step, so a turn that fails in analyst/sales has already stored
+    # the human message and the router/collector updates: put the conversation back as it was
+    try:
+        if before is None:
+            await _graph.checkpointer.adelete_thread(session_id)
+        else:
+            await _graph.aupdate_state(before.config, None, as_node="__copy__")
+    except Exception as e:
+        log.error(f"❌ Could not roll back {session_id} after a failed turn: {e}")
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- 2. APP ---
+@asynccontextmanager
+async def lifespan(app):
+    global _turn_slots, _graph
+    _turn_slots = asyncio.Semaphore(MAX_CONCURRENT_TURNS)
+    # Open the persisted index and compile the graph once, before the first request
+    if os.path.exists(resources.POLICY_FOLDER):
+        await resources.run_blocking(resources.get_vectorstore)
+    # Category prototypes are embedded once here instead of inside the first conversation's turn
+    if extractors.CLASSIFIER_ENABLED:
+        try:
+            await resources.run_blocking(extractors.category_prototypes)
+        except Exception as e:
+            log.warning(f"⚠️ Category classifier not warmed up: {e}")
+    async with resources.open_async_graph() as graph:
+        _graph = graph
+        yield
+    resources.get_executor().shutdown(wait=False)
+
+api = FastAPI(title="Policy Recommendation API", lifespan=lifespan)
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+class ChatResponse(BaseModel):
+    session_id: str
+    reply: str
+    category: Optional[str] = None
+    category_confirmed: bool = False
+    waiting_for: Optional[str] = None
+    collected_data: Dict[str, Any] = {}
+
+@api.get("/health")
+async def health():
+    return {"status": "ok", "index": resources.get_index_status(), "sessions": len(SESSION_LOCKS)}
+
+@api.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    session_id = request.session_id or uuid.uuid4().hex
+    lock = get_session_lock(session_id)
+
+    # Turns of one conversation are serialized; different conversations run concurrently.
+    # A failed turn is rolled back to the checkpoint it started from.
+    async with lock, _turn_slots:
+        config = resources.thread_config(session_id)
+        before = await _graph.checkpointer.aget_tuple(config)
+        try:
+            with telemetry.span("api.chat", session_id=session_id):
+                result = await _graph.ainvoke({"messages": [("human", request.message)]}, config)
+        except Exception as e:
+            log.error(f"❌ API turn failed for {session_id}: {e}")
+            await rollback_turn(session_id, before)
+            raise HTTPException(status_code=502, detail=f"Agent error: {e}")
+
+    return ChatResponse(**turn_summary(session_id, result, last_reply(result)))
+
+@api.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    # Server-sent events: "token" events while analyst/sales write, then one "done" with the turn summary
+    session_id = request.session_id or uuid.uuid4().hex
+    lock = get_session_lock(session_id)
+
+    async def events():
+        async with lock, _turn_slots:
+            result = None
+            inputs = {"messages": [("human", request.message)]}
+            config = resources.thread_config(session_id)
+            before = await _graph.checkpointer.aget_tuple(config)
+            try:
+                with telemetry.span("api.chat_stream", session_id=session_id):
+                    async for mode, chunk in _graph.astream(inputs, config, stream_mode=["custom", "values"]):
+                        if mode == "values":
+                            result = chunk
+                        elif chunk.get("token"):
+                            yield sse("token", {"node": chunk.get("node"), "token": chunk["token"]})
+            except Exception as e:
+                log.error(f"❌ API stream failed for {session_id}: {e}")
+                await rollback_turn(session_id, before)
+                yield sse("error", {"session_id": session_id, "detail": f"Agent error: {e}"})
+                return
+        yield sse("done", turn_summary(session_id, result, last_reply(result)))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@api.post("/sessions/{session_id}/reset")
+async def reset_session(session_id: str):
+    async with get_session_lock(session_id):
+        await _graph.checkpointer.adelete_thread(session_id)
+    return {"session_id": session_id, "reply": GREETING}
+
+@api.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    config = resources.thread_config(session_id)
+    if await _graph.checkpointer.aget_tuple(config) is None:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    async with get_session_lock(session_id):
+        await _graph.checkpointer.adelete_thread(session_id)
+    SESSION_LOCKS.pop(session_id, None)
+    return {"session_id": session_id, "deleted": True}
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text format: node/LLM/retrieval/ingestion spans, cache and call counters
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@api.get("/traces")
+async def traces(limit: int = 100):
+    # Most recent finished spans (set TRACE_FILE to also keep them as JSON lines on disk)
+    return telemetry.recent_traces(limit)
+
+@api.post("/index/refresh")
+async def refresh_index():
+    # Re-indexing is long and CPU-heavy: its own thread, so searches keep their pool
+    vs, msg = await asyncio.to_thread(resources.refresh_vectorstore, resources.POLICY_FOLDER)
+    if not vs:
+        raise HTTPException(status_code=500, detail=msg)
+    return {"status": msg}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(api, host=os.getenv("API_HOST", "0.0.0.0"), port=int(os.getenv("API_PORT", "8000")))
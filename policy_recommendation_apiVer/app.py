@@ -1,47 +1,55 @@
 import streamlit as st
 import os
-from utils import load_policies_from_folder # Import the new function
-from workflow import create_graph
+import uuid
+import resources # Shared embedding model, vector store and compiled graph
+from agents import llm # Shared chat model (with its response cache)
+import telemetry # Spans/metrics; METRICS_PORT serves /metrics and /traces for this process
 
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="Modular Policy Bot", layout="wide")
 st.title("Policy Recommendation System")
 
+telemetry.start_metrics_server()
+
+# --- SHARED INDEX (one per process, not per session) ---
+if os.path.exists(resources.POLICY_FOLDER):
+    with st.spinner("Opening policy index..."):
+        resources.get_vectorstore()
+
 # --- SESSION STATE ---
+# The conversation state lives in the graph checkpointer under a thread id; the ?session=
+# URL parameter lets a reload (or another worker) pick the same conversation back up.
+GREETING = "Hello! I can help you with Health, Vehicle, Pet, and Property insurance. How can I assist you today?"
+app = resources.get_graph()
+
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.thread_id
+config = resources.thread_config(st.session_state.thread_id)
+agent_state = app.get_state(config).values or {}
+
 if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {"role": "assistant", "content": "Hello! I can help you with Health, Vehicle, Pet, and Property insurance. How can I assist you today?"}
+    # Only used to draw the chat; restored from the (windowed) checkpoint history
+    history = agent_state.get("messages") or []
+    st.session_state.messages = [{"role": "assistant", "content": GREETING}] + [
+        {"role": "user" if role == "human" else "assistant", "content": content} for role, content in history
     ]
-if "vectorstore" not in st.session_state:
-    st.session_state.vectorstore = None
-if "recommended_plan" not in st.session_state:
-    st.session_state.recommended_plan = None  # <--- ADD THIS
-if "policy_context" not in st.session_state:
-    st.session_state.policy_context = None
-if "collected_data" not in st.session_state:
-    st.session_state.collected_data = {}
-if "current_category" not in st.session_state:
-    st.session_state.current_category = None
-if "last_asked_field" not in st.session_state:
-    st.session_state.last_asked_field = None
-if "category_confirmed" not in st.session_state:
-    st.session_state.category_confirmed = False  # [NEW] Default to False
 
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("Policy Database")
     # Check if folder exists
-    policy_folder = "policies"
+    policy_folder = resources.POLICY_FOLDER
     if not os.path.exists(policy_folder):
         os.makedirs(policy_folder)
         st.warning(f"Created '{policy_folder}' folder. Please add PDFs there.")
 
     # Status Indicator
+    st.caption(resources.get_index_status())
     if st.button("Load/Refresh Policies"):
         with st.spinner("Indexing policies..."):
-            vs, msg = load_policies_from_folder(policy_folder)
+            vs, msg = resources.refresh_vectorstore(policy_folder)
             if vs:
-                st.session_state.vectorstore = vs
                 st.success(msg)
             else:
                 st.error(msg)
@@ -50,13 +58,22 @@ with st.sidebar:
     # Clear / Reset Button
     if st.button("Reset Conversation"):
         st.session_state.clear()
+        st.query_params["session"] = uuid.uuid4().hex
         st.rerun()
 
     st.markdown("---")
     st.subheader("Debug State")
-    st.write(f"Category: {st.session_state.current_category}")
-    st.write(f"Waiting For: {st.session_state.last_asked_field}")
-    st.json(st.session_state.collected_data)
+    if hasattr(llm, "stats"):
+        cache = llm.stats()
+        st.caption(f"LLM cache: {cache['hits']} hits / {cache['misses']} misses ({cache['entries']} entries)")
+    vectorstore = resources.get_vectorstore()
+    if hasattr(vectorstore, "cache_stats"):
+        cache = vectorstore.cache_stats()
+        st.caption(f"Retrieval cache: {cache['embeddings']['hits']} embedding hits, {cache['results']['hits']} result hits")
+    st.write(f"Session: {st.session_state.thread_id}")
+    st.write(f"Category: {agent_state.get('current_category')}")
+    st.write(f"Waiting For: {agent_state.get('last_asked_field')}")
+    st.json(agent_state.get("collected_data") or {})
         
 # --- CHAT LOOP ---
 for msg in st.session_state.messages:
@@ -74,40 +91,27 @@ if user_input:
 
     # --- REMOVED THE MANUAL SIMULATION BLOCK HERE ---
 
-    # 3. Prepare Inputs for Graph
-    graph_messages = []
-    for m in st.session_state.messages:
-        role = "human" if m["role"] == "user" else "ai"
-        graph_messages.append((role, m["content"]))
-    
-    inputs = {
-        "messages": graph_messages,
-        "collected_data": st.session_state.collected_data, # Pass persistent data
-        "current_category": st.session_state.current_category,
-        "category_confirmed": st.session_state.category_confirmed,
-        "last_asked_field": st.session_state.last_asked_field,
-        "vectorstore": st.session_state.vectorstore,
-        "recommended_plan": st.session_state.recommended_plan,
-        "policy_context": st.session_state.policy_context
-    }
+    # 3. Prepare Inputs for Graph: just the new message, the checkpointer holds the rest
+    inputs = {"messages": [("human", user_input)]}
     
-    # 4. Run Graph (The ONLY logic source now)
-    with st.spinner("Agent is thinking..."):
+    # 4. Run Graph (The ONLY logic source now), streaming analyst/sales tokens as they arrive
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
         try:
-            app = create_graph()
-            result = app.invoke(inputs)
-            
-            st.session_state.recommended_plan = result.get("recommended_plan")
-            st.session_state.last_asked_field = result.get("last_asked_field")
-            st.session_state.collected_data = result.get("collected_data", {})
-            st.session_state.current_category = result.get("current_category")
-            st.session_state.category_confirmed = result.get("category_confirmed", False)
-            st.session_state.policy_context = result.get("policy_context")
+            result = None
+            streamed = ""
+            with st.spinner("Agent is thinking..."):
+                for mode, chunk in app.stream(inputs, config, stream_mode=["custom", "values"]):
+                    if mode == "values":
+                        result = chunk
+                    elif chunk.get("token"):
+                        streamed += chunk["token"]
+                        placeholder.markdown(streamed + "▌")
             
             last_msg = result["messages"][-1]
 
             # Handle LangGraph message format
-            if isinstance(last_msg, tuple):
+            if isinstance(last_msg, (tuple, list)):
                 role, content = last_msg
             else:
                 role = last_msg.type if hasattr(last_msg, 'type') else "unknown"
@@ -116,14 +120,12 @@ if user_input:
             # [FIX 2] Fallback Logic if AI is silent
             if role == "ai":
                 st.session_state.messages.append({"role": "assistant", "content": content})
-                with st.chat_message("assistant"):
-                    st.markdown(content)
+                placeholder.markdown(content)
             else:
                 # If role is 'human', it means the graph returned the user's message back (no new AI output)
                 fallback_msg = "I'm sorry, I didn't quite understand that. Could you please specify which type of insurance (Health, Vehicle, Pet, etc.) you are interested in?"
                 st.session_state.messages.append({"role": "assistant", "content": fallback_msg})
-                with st.chat_message("assistant"):
-                    st.markdown(fallback_msg)
+                placeholder.markdown(fallback_msg)
             # st.rerun()
         except Exception as e:
 
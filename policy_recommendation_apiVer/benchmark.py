@@ -0,0 +1,329 @@
+# benchmark.py
+# Offline benchmark: no Gemini, no network. A deterministic stand-in replaces the chat model,
+# scripted conversations are replayed through create_graph(), and ingestion/retrieval are timed.
+# Run with: python benchmark.py [--fake-embeddings] [--json out.json] [--baseline old.json]
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# agents.py builds the real client at import time; it is replaced before any call is made
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import resources
+from context_builder import estimate_tokens
+
+# --- 1. SCRIPTED CONVERSATIONS ---
+# Each turn is one human message; the graph state carries over between turns (one thread per run)
+CONVERSATIONS = [
+    {"name": "health_family", "turns": [
+        "I need health insurance",
+        "yes",
+        "I'm 34, 2A+1C, 5 lakhs, tier 2, none, maternity",
+        "what about 2 years?",
+        "show me other options",
+    ]},
+    {"name": "two_wheeler", "turns": [
+        "I want to insure my bike",
+        "yes",
+        "bike, registered in 2021, 150cc, idv 80000, 20% ncb, 1 year",
+        "how much for 3 years?",
+    ]},
+    {"name": "pet_dog", "turns": [
+        "pet insurance for my dog please",
+        "correct",
+        "dog, labrador, 3 years old, worth 50000",
+    ]},
+    {"name": "category_switch", "turns": [
+        "looking for travel cover",
+        "no, actually car insurance",
+        "yes",
+        "car, registered in 2019, 1200cc, idv 6 lakhs, 0% ncb, 1 year",
+    ]},
+    {"name": "property_home", "turns": [
+        "home insurance for my flat",
+        "yes",
+        "home, rebuild cost 50 lakhs, contents worth 10 lakhs, cctv",
+        "can you compare the premiums?",
+    ]},
+    # Answers spread over two turns: the analyst turn can use the candidates prefetched after the first
+    {"name": "health_two_step", "turns": [
+        "need a health plan for my parents",
+        "yes",
+        "eldest is 62, 2 adults, 10 lakhs",
+        "tier 1, diabetes, none",
+    ]},
+]
+
+# --- 2. STUB LLM ---
+class StubLLM:
+    # Deterministic stand-in for ChatGoogleGenerativeAI: same prompt -> same answer, counted.
+    # Token counts are estimates (4 characters per token), good enough to compare runs.
+
+    def __init__(self, latency_ms=0, reply_words=120):
+        self.model = "offline-stub"
+        self.temperature = 0.0
+        self.latency = latency_ms / 1000.0
+        self.reply_words = reply_words
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _answer(self, prompt):
+        self.calls += 1
+        self.prompt_tokens += estimate_tokens(prompt)
+        if "Output JSON" in prompt:
+            # Intent/extraction prompts: "nothing new", so the scripted turns rely on the local fast path
+            content = json.dumps({"confirmed": True, "switch_detected": False, "new_category": None, "extracted_data": {}})
+        else:
+            seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+            words = [seed[i % len(seed):][:6] for i in range(self.reply_words)]
+            content = "Stub reply: " + " ".join(words)
+        self.completion_tokens += estimate_tokens(content)
+        return content
+
+    def invoke(self, prompt, *args, **kwargs):
+        content = self._answer(str(prompt))
+        time.sleep(self.latency)
+        return AIMessage(content=content)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        content = self._answer(str(prompt))
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=content)
+
+    def stream(self, prompt, *args, **kwargs):
+        content = self._answer(str(prompt))
+        time.sleep(self.latency)
+        for i in range(0, len(content), 16):
+            yield AIMessageChunk(content=content[i:i + 16])
+
+    async def astream(self, prompt, *args, **kwargs):
+        content = self._answer(str(prompt))
+        await asyncio.sleep(self.latency)
+        for i in range(0, len(content), 16):
+            yield AIMessageChunk(content=content[i:i + 16])
+
+def install_stub_llm(stub, cache_path=None):
+    # Every node reads the module-level agents.llm at call time
+    import agents
+    from telemetry import TracedLLM
+    if cache_path:
+        from llm_cache import CachedLLM
+        agents.llm = TracedLLM(CachedLLM(stub, path=cache_path))
+    else:
+        agents.llm = TracedLLM(stub)
+    return agents.llm
+
+# --- 3. MEASUREMENTS ---
+def summarize(values):
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+def bench_ingestion(folder, persist_dir, workers=None):
+    from utils import load_policies_from_folder, load_manifest
+
+    started = time.perf_counter()
+    vectorstore, msg = load_policies_from_folder(folder, persist_dir=persist_dir, rebuild=True, workers=workers)
+    elapsed = time.perf_counter() - started
+    if vectorstore:
+        vectorstore.drop_retired()
+    manifest = load_manifest(persist_dir) or {"files": {}}
+    files = len(manifest["files"])
+    chunks = sum(len(entry.get("chunk_ids", [])) for entry in manifest["files"].values())
+    return vectorstore, {
+        "status": msg,
+        "files": files,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(files / elapsed, 2) if elapsed else None,
+        "chunks_per_s": round(chunks / elapsed, 2) if elapsed else None,
+    }
+
+def replay(graph, stub, conversation):
+    # -> one record per turn: wall time, per-node time, LLM calls and prompt tokens
+    config = resources.thread_config(f"bench-{conversation['name']}-{uuid.uuid4().hex[:8]}")
+    turns = []
+    for text in conversation["turns"]:
+        calls, tokens = stub.calls, stub.prompt_tokens
+        nodes = []
+        started = last = time.perf_counter()
+        # Nodes run one after another: the gap between two "updates" events is the node's own time
+        for update in graph.stream({"messages": [("human", text)]}, config, stream_mode="updates"):
+            now = time.perf_counter()
+            for node in update:
+                nodes.append((node, now - last))
+            last = now
+        turns.append({
+            "conversation": conversation["name"],
+            "text": text,
+            "seconds": time.perf_counter() - started,
+            "nodes": nodes,
+            "llm_calls": stub.calls - calls,
+            "prompt_tokens": stub.prompt_tokens - tokens,
+        })
+    return turns, graph.get_state(config).values
+
+def bench_retrieval(vectorstore, profiles, repeats=3):
+    # Analyst-shaped queries from the replayed profiles; cold = caches emptied before each query
+    import utils
+
+    queries = []
+    for state in profiles:
+        category = state.get("current_category")
+        if category:
+            values = " ".join(str(v) for v in (state.get("collected_data") or {}).values())
+            queries.append((f"{category} insurance policy features coverage {values}", category))
+    cold, warm = [], []
+    for query, category in queries:
+        for _ in range(repeats):
+            vectorstore.results.clear()
+            utils._query_embeddings.clear()
+            started = time.perf_counter()
+            vectorstore.search_policies(query, n=3, category=category)
+            cold.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        vectorstore.search_policies(query, n=3, category=category)
+        warm.append(time.perf_counter() - started)
+    return {"queries": len(queries), "cold": summarize(cold), "warm": summarize(warm)}
+
+def run_benchmark(folder=resources.POLICY_FOLDER, conversations=CONVERSATIONS, fake_embeddings=False,
+                  llm_latency_ms=0, llm_cache=False, workers=None):
+
+    from langgraph.checkpoint.memory import InMemorySaver
+    from workflow import create_graph
+    from cases import CaseStore
+
+    if fake_embeddings:
+        # Hash-based vectors: measures the pipeline without downloading MiniLM (not search quality)
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        resources._embeddings = DeterministicFakeEmbedding(size=384)
+
+    workdir = tempfile.mkdtemp(prefix="policy_bench_")
+    try:
+        vectorstore, ingestion = bench_ingestion(folder, os.path.join(workdir, "chroma_db"), workers)
+        resources._set_vectorstore(vectorstore, ingestion["status"])
+        # Empty learned-case store of its own: never reads or writes the real one
+        resources._case_store = CaseStore(os.path.join(workdir, "chroma_db"))
+
+        stub = StubLLM(latency_ms=llm_latency_ms)
+        install_stub_llm(stub, os.path.join(workdir, "llm_cache.sqlite") if llm_cache else None)
+        graph = create_graph(checkpointer=InMemorySaver())
+
+        turns, profiles = [], []
+        for conversation in conversations:
+            records, final_state = replay(graph, stub, conversation)
+            turns += records
+            profiles.append(final_state)
+
+        by_node = {}
+        for record in turns:
+            for node, seconds in record["nodes"]:
+                by_node.setdefault(node, []).append(seconds)
+        return {
+            "ingestion": ingestion,
+            "turns": summarize([t["seconds"] for t in turns]),
+            "nodes": {node: summarize(values) for node, values in sorted(by_node.items())},
+            "llm": {
+                "calls": stub.calls,
+                "calls_per_turn": round(stub.calls / len(turns), 3) if turns else 0.0,
+                "prompt_tokens": stub.prompt_tokens,
+                "prompt_tokens_per_turn": round(stub.prompt_tokens / len(turns), 1) if turns else 0.0,
+                "completion_tokens": stub.completion_tokens,
+            },
+            "retrieval": bench_retrieval(vectorstore, profiles) if vectorstore else {},
+            "per_turn": [
+                {key: record[key] for key in ("conversation", "text", "llm_calls", "prompt_tokens")}
+                | {"ms": round(record["seconds"] * 1000, 2), "nodes": [n for n, _ in record["nodes"]]}
+                for record in turns
+            ],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# --- 4. REPORTING ---
+def print_report(report):
+
+    ing = report["ingestion"]
+    print(f"\n📥 Ingestion: {ing['files']} files / {ing['chunks']} chunks in {ing['seconds']}s "
+          f"({ing['files_per_s']} files/s, {ing['chunks_per_s']} chunks/s)")
+    print(f"💬 Turns: {report['turns']}")
+    for node, stats in report["nodes"].items():
+        print(f"   ⏱️ {node:<10} {stats}")
+    llm = report["llm"]
+    print(f"🤖 LLM: {llm['calls']} calls ({llm['calls_per_turn']}/turn), "
+          f"~{llm['prompt_tokens']} prompt tokens (~{llm['prompt_tokens_per_turn']}/turn)")
+    if report["retrieval"]:
+        ret = report["retrieval"]
+        print(f"🔎 Retrieval ({ret['queries']} queries): cold {ret['cold']} | warm {ret['warm']}")
+    for record in report["per_turn"]:
+        print(f"   {record['conversation']:<16} {record['ms']:>9.2f} ms  llm={record['llm_calls']} "
+              f"tokens={record['prompt_tokens']:<5} {'>'.join(record['nodes'])}  | {record['text']}")
+
+def compare(report, baseline, tolerance):
+    # -> list of regressions: latency means beyond (1 + tolerance) x baseline, or more LLM calls/tokens
+    regressions = []
+    checks = [("turns", report["turns"], baseline.get("turns", {}))]
+    checks += [(f"node {n}", s, baseline.get("nodes", {}).get(n, {})) for n, s in report["nodes"].items()]
+    if report.get("retrieval") and baseline.get("retrieval"):
+        checks.append(("retrieval cold", report["retrieval"]["cold"], baseline["retrieval"]["cold"]))
+    for name, current, old in checks:
+        if old.get("mean_ms") and current.get("mean_ms", 0) > old["mean_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: mean {current['mean_ms']} ms vs {old['mean_ms']} ms")
+    for key in ("calls", "prompt_tokens"):
+        old = baseline.get("llm", {}).get(key)
+        if old is not None and report["llm"][key] > old:
+            regressions.append(f"llm {key}: {report['llm'][key]} vs {old}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark: stub LLM, scripted conversations, ingestion and retrieval timings.")
+    parser.add_argument("--policies", default=resources.POLICY_FOLDER, help="Folder of policy PDFs/TXTs to ingest")
+    parser.add_argument("--conversations", default=None, help='JSON file: [{"name": ..., "turns": [...]}, ...]')
+    parser.add_argument("--fake-embeddings", action="store_true", help="Hash embeddings instead of MiniLM (no model download)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Simulated model latency per LLM call")
+    parser.add_argument("--llm-cache", action="store_true", help="Put the stub behind the SQLite response cache")
+    parser.add_argument("--workers", type=int, default=None, help="Ingestion workers (default: INGEST_WORKERS)")
+    parser.add_argument("--json", default=None, help="Write the full report to this file")
+    parser.add_argument("--baseline", default=None, help="Earlier --json report; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    conversations = CONVERSATIONS
+    if args.conversations:
+        with open(args.conversations, "r", encoding="utf-8") as f:
+            conversations = json.load(f)
+
+    report = run_benchmark(args.policies, conversations, args.fake_embeddings, args.llm_latency_ms,
+                           args.llm_cache, args.workers)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.json}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
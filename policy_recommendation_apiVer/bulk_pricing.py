@@ -0,0 +1,280 @@
+# bulk_pricing.py
+# Back-office bulk quoting: a table of customer profiles x every compiled policy -> premium matrix.
+# Evaluates the same compiled tables as pricing.py, but column-wise with NumPy instead of row by row.
+import argparse
+import csv
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from pricing import (
+    get_pricing_tables, raw_profile, normalize_input, derive_inputs, _as_number, CONDITION_OPS, NotQuotable,
+    Constant, BandTable, ChoiceTable, Linear, Base, Step, PROFILE_ALIASES
+)
+
+# --- 1. PROFILE TABLE ---
+class ProfileTable:
+    # Normalized profiles stored as one column per pricing input, built once and shared by every policy
+
+    def __init__(self, profiles):
+        if isinstance(profiles, dict):
+            # Column-oriented input: {"age": [...], "sum_insured": [...]}
+            names = list(profiles)
+            profiles = [dict(zip(names, row)) for row in zip(*profiles.values())]
+        # Same result as normalize_profile() per row, but the aliased inputs (age, sum insured, tenure...)
+        # are parsed column by column; derived inputs (family, engine, breed) are still built per row
+        raws = [raw_profile(p) for p in profiles]
+        self.n = len(raws)
+        present = {key for raw in raws for key in raw}
+        inputs = {}
+        for canonical, keys in PROFILE_ALIASES.items():
+            column = np.full(self.n, None, dtype=object)
+            filled = np.zeros(self.n, dtype=bool)
+            for key in keys:
+                if key in present:
+                    values, parsed = _parse_column(canonical, [raw.get(key) for raw in raws])
+                    take = parsed & ~filled
+                    column[take] = values[take]
+                    filled |= take
+            if filled.any():
+                inputs[canonical] = column
+        self.rows = [
+            derive_inputs(raw, {name: column[i] for name, column in inputs.items() if column[i] is not None})
+            for i, raw in enumerate(raws)
+        ]
+        self._columns = {}
+
+    def column(self, name):
+        # -> (raw values as object array, numeric view with NaN, present mask)
+        if name not in self._columns:
+            values = np.empty(self.n, dtype=object)
+            values[:] = [row.get(name) for row in self.rows]
+            present = np.array([v is not None for v in values], dtype=bool)
+            numbers = np.array(
+                [np.nan if v is None or _as_number(v) is None else _as_number(v) for v in values],
+                dtype=float
+            )
+            self._columns[name] = (values, numbers, present)
+        return self._columns[name]
+
+def _parse_column(canonical, raw_values):
+    # -> (parsed values, parsed mask); each distinct raw value is parsed once and gathered back, since a
+    # bulk table repeats the same ages, sums insured and tenures
+    raw = np.empty(len(raw_values), dtype=object)
+    raw[:] = raw_values
+    given = np.not_equal(raw, None)
+    if set(map(type, raw[given])) <= {str}:
+        # Text columns (CSV, collected answers): np.unique does the grouping
+        distinct, codes = np.unique(raw[given].astype(str), return_inverse=True)
+        distinct = distinct.tolist()
+    else:
+        # Mixed types, keyed by type too: 1, 1.0 and True parse differently
+        keys, distinct, codes = {}, [], []
+        for value in raw[given]:
+            key = (type(value), value if isinstance(value, Hashable) else id(value))
+            if key not in keys:
+                keys[key] = len(distinct)
+                distinct.append(value)
+            codes.append(keys[key])
+    values = np.empty(len(distinct), dtype=object)
+    values[:] = [normalize_input(canonical, value) for value in distinct]
+    column = np.full(len(raw), None, dtype=object)
+    column[given] = values[np.asarray(codes, dtype=np.intp).reshape(-1)]
+    return column, np.not_equal(column, None)
+
+class _PolicyColumns:
+    # One policy's view of the table: fills its defaults, checks allowed values and
+    # accumulates the rows that cannot be quoted (the vector form of NotQuotable)
+
+    def __init__(self, table, pricing):
+        self.table = table
+        self.defaults = pricing.defaults
+        self.allowed = pricing.allowed
+        self.invalid = np.zeros(table.n, dtype=bool)
+
+    def get(self, name, active):
+        values, numbers, present = self.table.column(name)
+        default = self.defaults.get(name)
+        if default is not None:
+            values = np.where(present, values, default).astype(object)
+            fill = _as_number(default)
+            numbers = np.where(present, numbers, np.nan if fill is None else fill)
+        else:
+            self.invalid |= active & ~present
+        allowed = self.allowed.get(name)
+        if allowed:
+            if all(_as_number(a) is not None and not isinstance(a, str) for a in allowed):
+                ok = np.isin(numbers, [float(a) for a in allowed])
+            else:
+                ok = np.isin(values.astype(str), [str(a) for a in allowed])
+            self.invalid |= active & ~ok
+        return values, numbers
+
+    def fail(self, mask, active):
+        self.invalid |= active & mask
+
+# --- 2. VECTOR EVALUATION OF COMPILED TABLES ---
+def _choices(table, cols, active):
+
+    values, numbers = cols.get(table.on, active)
+    return _lookup(table, values, numbers, cols, active)
+
+def _lookup(table, values, numbers, cols, active):
+
+    fallback = np.nan if table.fallback is None else table.fallback
+    if table.numeric:
+        conditions = [np.abs(numbers - choice) < 1e-9 for choice, _ in table.choices]
+        result = np.select(conditions, [value for _, value in table.choices], default=fallback)
+    else:
+        # Free-text keys: resolve each distinct value once with the scalar matcher, then gather
+        keys = np.char.lower(np.char.strip(values.astype(str)))
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        resolved = np.empty(len(uniques), dtype=float)
+        for i, key in enumerate(uniques):
+            try:
+                resolved[i] = table.lookup(key)[0]
+            except NotQuotable:
+                resolved[i] = np.nan
+        result = resolved[inverse.reshape(-1)]
+    cols.fail(np.isnan(result), active)
+    return result
+
+def _evaluate(node, cols, active):
+
+    n = cols.table.n
+    if isinstance(node, Constant):
+        return np.full(n, node.amount)
+    if isinstance(node, Linear):
+        total = np.full(n, node.const)
+        for name, coefficient in node.terms:
+            _, x = cols.get(name, active)
+            cols.fail(np.isnan(x), active)
+            total = total + coefficient * np.nan_to_num(x)
+        return total
+    if isinstance(node, BandTable):
+        _, x = cols.get(node.on, active)
+        conditions = [
+            (x >= low) & (np.ones(n, dtype=bool) if high is None else x <= high)
+            for low, high, _ in node.bands
+        ]
+        cols.fail(~np.any(conditions, axis=0), active)
+        if node.by is None:
+            choices = [np.full(n, value) for _, _, value in node.bands]
+        else:
+            choices = [_choices(value, cols, active & cond) for (_, _, value), cond in zip(node.bands, conditions)]
+        # np.select keeps the first matching band, like the scalar table
+        return np.select(conditions, choices, default=np.nan)
+    if isinstance(node, ChoiceTable):
+        return _choices(node, cols, active)
+    raise TypeError(f"Cannot vectorize {type(node).__name__}")
+
+def _holds(condition, cols, active):
+
+    if condition is None:
+        return active
+    values, numbers = cols.get(condition.input, active)
+    if condition.op == "has":
+        holds = np.char.find(np.char.lower(values.astype(str)), str(condition.value)) >= 0
+    elif isinstance(condition.value, float):
+        holds = CONDITION_OPS[condition.op](numbers, condition.value) & ~np.isnan(numbers)
+    else:
+        holds = np.asarray(CONDITION_OPS[condition.op](values, condition.value), dtype=bool)
+    return active & holds
+
+def _base(base: Base, cols, active):
+
+    rate = _evaluate(base.value, cols, active)
+    if not base.of:
+        return rate
+    _, basis = cols.get(base.of, active)
+    cols.fail(np.isnan(basis), active)
+    return basis / base.per * rate
+
+def _apply(step: Step, premium, cols, active):
+
+    mask = _holds(step.when, cols, active)
+    amount = _evaluate(step.value, cols, mask)
+    if step.kind == "multiply":
+        return np.where(mask, premium * amount, premium)
+    return np.where(mask, premium + amount, premium)
+
+def quote_policy_many(pricing, table):
+    # -> (premium before tax, total incl. GST); NaN where the scalar engine would say "Cannot quote"
+
+    cols = _PolicyColumns(table, pricing)
+    everyone = np.ones(table.n, dtype=bool)
+    premium = np.zeros(table.n)
+    with np.errstate(invalid="ignore"):
+        for component in pricing.components:
+            mask = _holds(component.when, cols, everyone)
+            amount = _base(component.base, cols, mask)
+            for step in component.steps:
+                amount = _apply(step, amount, cols, mask)
+            premium = premium + np.where(mask, amount, 0.0)
+        for step in pricing.steps:
+            premium = _apply(step, premium, cols, everyone)
+
+    premium = np.round(premium, 2)
+    total = premium + np.round(premium * pricing.gst, 2)
+    premium[cols.invalid] = np.nan
+    total[cols.invalid] = np.nan
+    return premium, total
+
+# --- 3. PUBLIC API ---
+@dataclass(frozen=True)
+class PremiumMatrix:
+    policies: List[str]
+    premiums: np.ndarray     # (profiles x policies) before tax
+    totals: np.ndarray       # (profiles x policies) including GST; NaN = not applicable
+    periods: List[str]
+
+    @property
+    def quotable(self):
+        return ~np.isnan(self.totals)
+
+    def cheapest(self):
+        # Index of the cheapest applicable policy per profile (-1 if none applies)
+        filled = np.where(self.quotable, self.totals, np.inf)
+        best = np.argmin(filled, axis=1)
+        return np.where(np.isfinite(filled[np.arange(len(best)), best]), best, -1)
+
+def quote_matrix(profiles, policies=None):
+    # profiles: list of collected_data-style dicts, or a dict of columns
+
+    tables = get_pricing_tables()
+    names = [p for p in (policies or tables) if p in tables]
+    table = profiles if isinstance(profiles, ProfileTable) else ProfileTable(profiles)
+
+    premiums = np.full((table.n, len(names)), np.nan)
+    totals = np.full((table.n, len(names)), np.nan)
+    for j, name in enumerate(names):
+        premiums[:, j], totals[:, j] = quote_policy_many(tables[name], table)
+    return PremiumMatrix(names, premiums, totals, [tables[name].period for name in names])
+
+def write_matrix_csv(matrix, path, ids=None):
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["profile"] + matrix.policies + ["cheapest"])
+        cheapest = matrix.cheapest()
+        for i, row in enumerate(matrix.totals):
+            best = matrix.policies[cheapest[i]] if cheapest[i] >= 0 else ""
+            cells = ["" if np.isnan(v) else f"{v:.2f}" for v in row]
+            writer.writerow([ids[i] if ids else i] + cells + [best])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quote every profile in a CSV against every policy.")
+    parser.add_argument("profiles", help="CSV with one profile per row (age, sum_insured, zone, ...)")
+    parser.add_argument("-o", "--output", default="premium_matrix.csv")
+    parser.add_argument("--id-column", default=None, help="Column used to label rows in the output")
+    args = parser.parse_args()
+
+    with open(args.profiles, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    ids = [row.pop(args.id_column, i) for i, row in enumerate(rows)] if args.id_column else None
+    matrix = quote_matrix(rows)
+    write_matrix_csv(matrix, args.output, ids)
+    print(f"✅ Quoted {len(rows)} profiles x {len(matrix.policies)} policies "
+          f"({int(matrix.quotable.sum())} applicable quotes) -> {args.output}")
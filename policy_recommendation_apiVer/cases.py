@@ -0,0 +1,134 @@
+# cases.py
+# Learned cases (profile -> chosen policy + reason): an append-only JSON-lines log plus a dedicated
+# Chroma collection, embedded one case at a time on write. Never part of the policy index rebuilds.
+import hashlib
+import json
+import os
+import threading
+import time
+
+from langchain_community.vectorstores import Chroma
+from resources import EMBEDDING_ID, chroma_collection, get_embeddings
+from telemetry import get_logger, incr, span
+
+log = get_logger(__name__)
+
+CASES_FILE = "learned_cases.jsonl"
+CASE_COLLECTION = "learned_cases"
+# Similarity (cosine) above which a past case is shown to the analyst / treated as a precedent
+CASE_MIN_SCORE = float(os.getenv("CASE_MIN_SCORE", "0.75"))
+CASE_PRECEDENT_SCORE = float(os.getenv("CASE_PRECEDENT_SCORE", "0.92"))
+CASE_NEIGHBOURS = int(os.getenv("CASE_NEIGHBOURS", "3"))
+
+def make_case_id(case):
+    payload = json.dumps([case["created"], case["category"], case["profile"], case["policy"]], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+class CaseStore:
+
+    def __init__(self, persist_dir, embeddings=None):
+        self.persist_dir = persist_dir
+        self.path = os.path.join(persist_dir, CASES_FILE)
+        self.embeddings = embeddings or get_embeddings()
+        self.store = Chroma(
+            collection_name=CASE_COLLECTION, persist_directory=persist_dir, embedding_function=self.embeddings,
+            collection_metadata={"hnsw:space": "cosine"}
+        )
+        self._lock = threading.Lock()
+        self.catch_up()
+
+    def cases(self):
+        # The log is the source of truth; unreadable lines are skipped, not fatal
+        if not os.path.exists(self.path):
+            return []
+        cases = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    cases.append(json.loads(line))
+                except ValueError:
+                    log.warning(f"⚠️ Skipping unreadable learned case in {self.path}")
+        return cases
+
+    def count(self):
+        return chroma_collection(self.store).count()
+
+    def catch_up(self):
+        # Embed only the logged cases the collection is missing (or that another model embedded)
+        cases = self.cases()
+        if not cases:
+            return 0
+        stored = chroma_collection(self.store).get(include=["metadatas"])
+        current = {cid for cid, meta in zip(stored["ids"], stored["metadatas"]) if (meta or {}).get("embedding_model") == EMBEDDING_ID}
+        missing = [case for case in cases if case["id"] not in current]
+        if missing:
+            log.info(f"🧠 Embedding {len(missing)} learned cases missing from {CASE_COLLECTION}")
+            self._embed(missing)
+        return len(missing)
+
+    def _embed(self, cases):
+
+        vectors = self.embeddings.embed_documents([case["text"] for case in cases])
+        chroma_collection(self.store).upsert(
+            ids=[case["id"] for case in cases], embeddings=vectors, documents=[case["text"] for case in cases],
+            # Everything nearest() returns lives in the metadata: a lookup never reads the log
+            metadatas=[{
+                "category": case["category"] or "General", "policy": case["policy"], "reason": case["reason"] or "",
+                "profile": json.dumps(case["profile"], default=str), "embedding_model": EMBEDDING_ID,
+            } for case in cases]
+        )
+
+    def add(self, text, category, profile, policy, reason):
+        # text: the profile as the analyst searches it, so a repeat profile matches its own case exactly
+        case = {
+            "created": time.time(),
+            "category": category,
+            "profile": profile,
+            "policy": policy,
+            "reason": reason,
+            "text": text,
+        }
+        case["id"] = make_case_id(case)
+        with span("cases.add", category=category), self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(case, default=str) + "\n")
+            self._embed([case])
+        incr("learned_cases_total")
+        return case
+
+    def nearest(self, embedding, k=CASE_NEIGHBOURS, category=None, min_score=CASE_MIN_SCORE):
+        # -> [{"policy", "reason", "profile", "score"}] best first; one query, cosine similarity
+        with span("cases.nearest", category=category, k=k) as attrs:
+            available = self.count()
+            if not available:
+                return []
+            found = chroma_collection(self.store).query(
+                query_embeddings=[embedding], n_results=min(k, available),
+                where={"category": category} if category else None, include=["metadatas", "distances"]
+            )
+            results = []
+            for meta, distance in zip(found["metadatas"][0], found["distances"][0]):
+                score = 1.0 - distance
+                if score >= min_score:
+                    results.append({
+                        "policy": meta["policy"], "reason": meta.get("reason", ""),
+                        "profile": json.loads(meta.get("profile") or "{}"), "score": round(score, 4),
+                    })
+            attrs["results"] = len(results)
+            return results
+
+def format_cases(cases):
+    # Prompt lines: what similar customers chose and why
+    lines = []
+    for case in cases:
+        profile = ", ".join(f"{k}={v}" for k, v in (case.get("profile") or {}).items())
+        lines.append(f"- Similar customer ({profile}) chose {case['policy']}: {case['reason']}")
+    return "\n".join(lines)
+
+def precedent_policies(cases, n=3, min_score=CASE_PRECEDENT_SCORE):
+    # Distinct policies of the strong precedents, best first
+    policies = []
+    for case in cases:
+        if case["score"] >= min_score and case["policy"] not in policies:
+            policies.append(case["policy"])
+    return policies[:n]
@@ -0,0 +1,134 @@
+# context_builder.py
+# Builds the policy text that goes into analyst/sales prompts under an explicit token budget:
+# most relevant chunks per policy first, overlapping chunk text removed, cut at sentence ends.
+import os
+import re
+
+from lexical import STOPWORDS, title_terms
+from digests import format_digest
+from schemas import CATEGORY_MAPPING
+
+# Rough size estimate (4 characters per token), also used by the benchmark report
+CHARS_PER_TOKEN = 4
+ANALYST_CONTEXT_TOKENS = int(os.getenv("ANALYST_CONTEXT_TOKENS", "600"))
+SALES_CONTEXT_TOKENS = int(os.getenv("SALES_CONTEXT_TOKENS", "400"))
+CHUNKS_PER_POLICY = int(os.getenv("CHUNKS_PER_POLICY", "3"))
+MIN_OVERLAP_CHARS = 30
+# ANALYST_DIGESTS=0 sends retrieved chunks to the analyst instead of the index-time policy digests
+ANALYST_DIGESTS = os.getenv("ANALYST_DIGESTS", "1") in ("1", "true", "True")
+
+SENTENCE_END = re.compile(r"(?<=[.!?:;])\s+|\n+")
+ORDINALS = {
+    0: r"first|1st|option 1|#1|policy 1|number 1",
+    1: r"second|2nd|option 2|#2|policy 2|number 2",
+    2: r"third|3rd|option 3|#3|policy 3|number 3",
+}
+GENERIC_TITLE_WORDS = {"pdf", "txt", "plan", "cover", "scheme", "prospectus", "brochure", "sales", "literature", "lite"}
+# Title words that name a topic or a term rather than one product: "price for 3 years?" and
+# "does it cover maternity?" are about every recommended policy, not the one with that word in its title
+TOPIC_TITLE_WORDS = {
+    "year", "years", "term", "long", "short", "care", "maternity", "daycare", "day", "procedure", "lifetime",
+    "package", "standalone", "individual", "family", "owner", "driver", "third", "party", "micro",
+} | {
+    word for broad, subtypes in CATEGORY_MAPPING.items()
+    for word in re.findall(r"[a-z]+", " ".join([broad] + subtypes).lower())
+}
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+# --- 1. TEXT HELPERS ---
+def _normalize(sentence):
+    return " ".join(re.sub(r"[^\w%₹]+", " ", sentence.lower()).split())
+
+def strip_overlap(text, included):
+    # Chunks overlap by CHUNK_OVERLAP characters: drop the head of this chunk already present in the context
+    limit = min(len(text), 200)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if text[:size] in included:
+            return text[size:].lstrip()
+    return text
+
+def fit_to_budget(text, tokens):
+    # Cut at the last sentence end inside the budget (hard cut only if there is none)
+    max_chars = tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    ends = [m.start() for m in SENTENCE_END.finditer(cut)]
+    return cut[:ends[-1]].rstrip() if ends and ends[-1] > max_chars // 2 else cut.rstrip() + "..."
+
+# --- 2. POLICY SELECTION ---
+def policies_mentioned(text, sources):
+    # Sources the question names ("the Arogya one", "second option"); [] = no policy in particular
+    text = (text or "").lower()
+    names = {
+        source: {
+            w for w in title_terms(source)
+            if len(w) >= 4 and not any(c.isdigit() for c in w)
+            and w not in STOPWORDS and w not in GENERIC_TITLE_WORDS and w not in TOPIC_TITLE_WORDS
+        }
+        for source in sources
+    }
+    picked = []
+    for i, source in enumerate(sources):
+        # Only words no other recommended title shares single a policy out
+        words = [w for w in names[source] if not any(w in names[other] for other in sources if other != source)]
+        by_name = any(re.search(rf"\b{re.escape(w)}", text) for w in words)
+        by_position = i in ORDINALS and re.search(rf"\b(?:{ORDINALS[i]})\b", text)
+        if by_name or by_position:
+            picked.append(source)
+    # A word shared by every title ("health") does not single anything out
+    return picked if len(picked) < len(sources) else []
+
+# --- 3. ASSEMBLY ---
+def assemble_policy_context(vectorstore, sources, query, leads=None, budget=ANALYST_CONTEXT_TOKENS):
+    # -> {source: text}; each policy gets an equal share of the budget, filled with its opening
+    # chunk (leads[source], if given) and then its chunks most relevant to the query
+    if not sources:
+        return {}
+    chunks = vectorstore.best_chunks(query, sources, CHUNKS_PER_POLICY) if vectorstore else {}
+    share = max(1, budget // len(sources))
+
+    texts = {}
+    for source in sources:
+        candidates = ([leads[source]] if leads and leads.get(source) else []) + [d.page_content for d in chunks.get(source, [])]
+        included, seen, used = [], set(), 0
+        for candidate in candidates:
+            candidate = strip_overlap(candidate, "\n".join(included))
+            # Sentence-level dedupe: the lead chunk is usually also the best-matching chunk
+            sentences = [s.strip() for s in SENTENCE_END.split(candidate) if s.strip()]
+            fresh = [s for s in sentences if _normalize(s) and _normalize(s) not in seen]
+            if not fresh:
+                continue
+            seen.update(_normalize(s) for s in fresh)
+            piece = fit_to_budget(" ".join(fresh), share - used)
+            included.append(piece)
+            used += estimate_tokens(piece)
+            if used >= share:
+                break
+        texts[source] = "\n".join(included)
+    return texts
+
+def digest_policy_context(vectorstore, sources, query, leads=None, budget=ANALYST_CONTEXT_TOKENS):
+    # Precomputed digests where the index has them; chunk assembly only for policies without one
+    if not sources:
+        return {}
+    share = max(1, budget // len(sources))
+    digests = getattr(vectorstore, "digests", None)
+    texts = {}
+    for source in sources:
+        digest = digests.get(source) if digests else None
+        if digest:
+            texts[source] = fit_to_budget(format_digest(digest), share)
+    missing = [source for source in sources if source not in texts]
+    if missing:
+        texts.update(assemble_policy_context(vectorstore, missing, query, leads, share * len(missing)))
+    return texts
+
+def format_policy_context(texts, sources):
+
+    return "".join(
+        f"\n--- POLICY OPTION {i}: {source} ---\n{texts.get(source, '')}\n"
+        for i, source in enumerate(sources, 1)
+    )
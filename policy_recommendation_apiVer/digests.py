@@ -0,0 +1,167 @@
+# digests.py
+# Compact extractive record per policy (covers, exclusions, waiting periods, ages...) built once at
+# index time and persisted next to the vector index, so prompts carry a few lines instead of raw chunks.
+import json
+import os
+import re
+
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
+DIGEST_FILE = "policy_digests.json"
+MAX_ITEMS = 5
+MAX_ITEM_CHARS = 120
+MAX_OVERVIEW_CHARS = 300
+
+# "  5. Scope of Coverage" -> section "scope of coverage"
+SECTION_RE = re.compile(r"^\s*\d+\.\s+(.+?)\s*$", re.MULTILINE)
+BULLET_RE = re.compile(r"^\s*[-+x•*]\s+(.+)$")
+NOISE_RE = re.compile(r"\[cite:[^\]]*\]|^Page \d+ - .*$|^Official Policy Schedule & Terms$", re.MULTILINE)
+FIELD_RE = r"^\s*{label}\s*:\s*(.+)$"
+AGE_RANGE_RE = re.compile(
+    r"(\d+)\s*(days?|months?|years?|yrs?)?\s*(?:to|-|–)\s*(\d+)\s*(years?|yrs?)", re.IGNORECASE
+)
+WAITING_RE = re.compile(r"waiting", re.IGNORECASE)
+
+# Section heading keyword -> digest field
+SECTIONS = {
+    "period": "period",
+    "overview": "overview",
+    "eligibility criteria": "eligibility",
+    "sum insured": "sum_insured",
+    "scope of coverage": "covers",
+    "add-on": "add_ons",
+    "exclusions": "exclusions",
+    "claims": "claims",
+}
+
+def _clean(text):
+    return re.sub(r"[ \t]+", " ", NOISE_RE.sub("", text)).strip()
+
+def _shorten(text, limit=MAX_ITEM_CHARS):
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "..."
+
+def split_sections(text):
+    # -> {digest field: section body}; documents without numbered headings give {}
+    sections = {}
+    matches = list(SECTION_RE.finditer(text))
+    for i, match in enumerate(matches):
+        heading = match.group(1).lower()
+        field = next((f for keyword, f in SECTIONS.items() if keyword in heading), None)
+        if field and field not in sections:
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            sections[field] = text[match.end():end]
+    return sections
+
+def _bullets(body):
+
+    items = []
+    for line in body.splitlines():
+        match = BULLET_RE.match(line)
+        if match:
+            items.append(match.group(1).strip())
+        elif items and line.strip() and not line.strip().endswith(":"):
+            # Wrapped PDF line: continuation of the previous item
+            items[-1] += " " + line.strip()
+    return [_shorten(item.rstrip(".")) for item in items[:MAX_ITEMS]]
+
+def _field(text, label):
+    match = re.search(FIELD_RE.format(label=label), text, re.IGNORECASE | re.MULTILINE)
+    return _shorten(match.group(1).strip()) if match else None
+
+def eligibility_ages(text):
+    # "Entry Age: 18 Years to 65 Years" -> "18 Years to 65 Years"; first range that reads as an age
+    for match in AGE_RANGE_RE.finditer(text):
+        low_unit = match.group(2) or match.group(4)
+        return f"{match.group(1)} {low_unit.capitalize()} to {match.group(3)} {match.group(4).capitalize()}"
+    return None
+
+def build_digest(file_name, category, text, broad_category=None):
+    # Runs inside the ingestion pool: plain dict, no model calls
+    text = _clean(text)
+    sections = split_sections(text)
+    # Overview lines are wrapped by the PDF: join them before splitting off "Ideal For:"
+    overview, _, ideal_for = " ".join(sections.get("overview", "").split()).partition("Ideal For:")
+    overview = overview.strip() or " ".join(text.split())
+
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    eligibility = sections.get("eligibility", "")
+    return {
+        "source": file_name,
+        "name": lines[0] if sections and lines else os.path.splitext(file_name)[0].replace("_", " "),
+        "category": category,
+        "broad_category": broad_category,
+        "provider": _field(text, "Provider"),
+        "duration": _field(sections.get("period", ""), "Standard Duration"),
+        "overview": _shorten(overview, MAX_OVERVIEW_CHARS),
+        "ideal_for": _shorten(ideal_for.strip()) or None,
+        "eligibility_ages": eligibility_ages(eligibility) or eligibility_ages(text),
+        "eligibility": _bullets(eligibility),
+        "sum_insured": _bullets(sections.get("sum_insured", "")),
+        "covers": _bullets(sections.get("covers", "")),
+        "add_ons": _bullets(sections.get("add_ons", "")),
+        "exclusions": _bullets(sections.get("exclusions", "")),
+        "waiting_periods": [
+            _shorten(BULLET_RE.sub(r"\1", line).rstrip(".")) for line in lines if WAITING_RE.search(line)
+        ][:MAX_ITEMS],
+        "pricing_key": None,
+    }
+
+def format_digest(digest):
+    # Prompt text: one labelled line per non-empty field, most decisive first (a budget cuts from the end)
+    lines = [f"{digest['name']} ({digest['category']}, {digest.get('provider') or 'provider n/a'})"]
+    if digest.get("duration"):
+        lines.append(f"Term: {digest['duration']}")
+    shown = ""
+    for label, key in (("Eligibility", "eligibility"), ("Sum insured", "sum_insured"), ("Covers", "covers"),
+                       ("Exclusions", "exclusions"), ("Waiting periods", "waiting_periods"), ("Add-ons", "add_ons")):
+        items = [item for item in digest.get(key) or [] if item not in shown]
+        if items:
+            lines.append(f"{label}: " + "; ".join(items))
+            shown += "\n".join(items)
+    if digest.get("eligibility_ages") and digest["eligibility_ages"] not in shown:
+        lines.insert(1, f"Entry age: {digest['eligibility_ages']}")
+    if not digest.get("pricing_key"):
+        lines.append("Pricing: no local rate table")
+    for label, key in (("Ideal for", "ideal_for"), ("Overview", "overview")):
+        if digest.get(key):
+            lines.append(f"{label}: {digest[key]}")
+    return "\n".join(lines)
+
+class DigestStore:
+    # digests: file_name -> digest dict (see build_digest)
+
+    def __init__(self, digests=None):
+        self.digests = digests or {}
+
+    def get(self, file_name):
+        return self.digests.get(file_name)
+
+    def add(self, digest):
+        self.digests[digest["source"]] = digest
+
+    def remove(self, file_name):
+        self.digests.pop(file_name, None)
+
+    def save(self, persist_dir):
+
+        os.makedirs(persist_dir, exist_ok=True)
+        path = os.path.join(persist_dir, DIGEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.digests, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, persist_dir):
+
+        path = os.path.join(persist_dir, DIGEST_FILE)
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ Ignoring unreadable policy digests {path}: {e}")
+            return cls()
@@ -0,0 +1,447 @@
+# extractors.py
+# Local fast path for router_node: regex/keyword parsing of confirmations, category
+# switches and profile answers. Only turns it cannot account for go to the LLM.
+import os
+import re
+import threading
+from datetime import date
+
+import numpy as np
+
+from schemas import CATEGORY_MAPPING, get_required_fields
+from telemetry import get_logger
+from parsing import (
+    NUMBER_REGEX, LARGE_BREEDS, AGGRESSIVE_BREEDS, TIER_1_CITIES, RISK_CLASS_KEYWORDS,
+    parse_zone, parse_vehicle_type
+)
+
+log = get_logger(__name__)
+
+# --- 1. CATEGORY KEYWORDS ---
+# Everyday words per broad category, on top of the words taken from CATEGORY_MAPPING below
+CATEGORY_SYNONYMS = {
+    "Health": ["health", "medical", "mediclaim", "hospital", "hospitalisation", "hospitalization", "illness", "maternity", "opd", "family floater"],
+    "Accident": ["accident", "accidental", "disability", "travel", "trip", "journey"],
+    "Vehicle": ["vehicle", "motor", "car", "bike", "scooter", "truck", "two wheeler", "auto", "taxi", "suv"],
+    "Pet": ["pet", "dog", "cat", "puppy", "kitten"],
+    "Agriculture": ["agriculture", "crop", "farm", "farmer", "cattle", "livestock", "poultry", "plantation", "fishery"],
+    "Property": ["property", "home", "house", "flat", "apartment", "fire", "shop", "factory", "building", "burglary"],
+    "Financial": ["financial", "cyber", "fraud", "credit", "loan", "fidelity", "bank", "banking"],
+    "Specialized": ["jewel", "jewellery", "jewelry", "jeweller", "gadget", "valuables"]
+}
+
+CATEGORY_STOPWORDS = {
+    "insurance", "cover", "standard", "product", "premium", "only", "long", "term", "type", "special",
+    "scheme", "government", "package", "group", "personal", "commercial", "human", "senior", "citizen", "large",
+    # Too common in ordinary answers ("two kids", "my own", "daily commute") to signal a category
+    "two", "own", "private", "daily", "cash", "top", "benefit", "income", "linked", "micro", "motor", "student",
+    "sports", "damage", "trade", "care", "owner", "business", "safe", "employee", "money", "block", "asset"
+}
+
+def _build_category_keywords():
+    # A word from CATEGORY_MAPPING is only a keyword if it points at exactly one broad category
+    owners = {}
+    for broad, subtypes in CATEGORY_MAPPING.items():
+        owners.setdefault(broad.lower(), set()).add(broad)
+        for subtype in subtypes:
+            for word in re.findall(r"[a-z]{3,}", subtype.lower()):
+                if word not in CATEGORY_STOPWORDS:
+                    owners.setdefault(word, set()).add(broad)
+    keywords = {broad: set(words) for broad, words in CATEGORY_SYNONYMS.items()}
+    for word, broads in owners.items():
+        if len(broads) == 1:
+            keywords.setdefault(next(iter(broads)), set()).add(word)
+    return {
+        broad: re.compile(r"\b(?:" + "|".join(sorted(map(re.escape, words), key=len, reverse=True)) + r")s?\b")
+        for broad, words in keywords.items()
+    }
+
+CATEGORY_KEYWORDS = _build_category_keywords()
+
+SWITCH_CUES = re.compile(r"\b(?:instead|switch|actually|rather|change|different)\b")
+PRODUCT_WORDS = r"\W+(?:\w+\W+){0,2}?(?:insurance|policy|policies|cover|plan)\b"
+YES_REGEX = re.compile(r"^(?:yes|yeah|yep|yup|ya|sure|correct|right|exactly|absolutely|ok|okay|definitely|that'?s (?:right|correct)|yes please)\b")
+NO_REGEX = re.compile(r"^(?:no|nope|nah|not really|wrong|incorrect)\b")
+FILLER_REGEX = re.compile(r"^(?:hi|hello|hey|ok|okay|thanks|thank you|yes|yeah|yep|sure|correct|right|please|go ahead|that'?s (?:it|all|right|correct))?[\s.!]*$")
+
+def detect_categories(text):
+
+    text = text.lower()
+    return [broad for broad, pattern in CATEGORY_KEYWORDS.items() if pattern.search(text)]
+
+def asks_for_category(broad, text):
+    # "car insurance", "switch to pet" - not just a passing mention ("I drive a car to work")
+    if SWITCH_CUES.search(text):
+        return True
+    return bool(re.search(CATEGORY_KEYWORDS[broad].pattern + PRODUCT_WORDS, text))
+
+# --- 2. EMBEDDING CATEGORY CLASSIFIER ---
+# For turns with no category keyword ("my laptop got stolen last year") or several: nearest
+# prototype among every broad category, subtype and synonym, embedded once per process.
+CLASSIFIER_ENABLED = os.getenv("CATEGORY_CLASSIFIER", "1") not in ("0", "false", "False")
+CLASSIFIER_MIN_SCORE = float(os.getenv("CLASSIFIER_MIN_SCORE", "0.45"))
+CLASSIFIER_MIN_MARGIN = float(os.getenv("CLASSIFIER_MIN_MARGIN", "0.05"))
+
+_prototypes = None
+_prototype_lock = threading.Lock()
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=float)
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12)
+
+def category_prototypes():
+    # -> (broad label per row, unit-length prototype matrix)
+    global _prototypes
+    if _prototypes is None:
+        with _prototype_lock:
+            if _prototypes is None:
+                from resources import get_embeddings
+                labels, phrases = [], []
+                for broad, subtypes in CATEGORY_MAPPING.items():
+                    synonyms = [f"{word} insurance" for word in CATEGORY_SYNONYMS.get(broad, [])]
+                    for phrase in [f"{broad} insurance"] + [s.replace(" - ", " ") for s in subtypes] + synonyms:
+                        labels.append(broad)
+                        phrases.append(phrase)
+                _prototypes = (labels, _unit(get_embeddings().embed_documents(phrases)))
+    return _prototypes
+
+def classify_category(text, candidates=None):
+    # -> broad category, or None when the best match is weak or too close to the runner-up
+    if not CLASSIFIER_ENABLED or not text.strip():
+        return None
+    try:
+        from resources import get_embeddings
+        labels, prototypes = category_prototypes()
+        scores = prototypes @ _unit(get_embeddings().embed_query(text))
+    except Exception as e:
+        log.warning(f"⚠️ Category classifier unavailable: {e}")
+        return None
+
+    best = {}
+    for label, score in zip(labels, scores):
+        if candidates is None or label in candidates:
+            best[label] = max(best.get(label, -1.0), float(score))
+    ranked = sorted(best.values(), reverse=True)
+    if not ranked:
+        return None
+    runner_up = ranked[1] if len(ranked) > 1 else -1.0
+    if ranked[0] < CLASSIFIER_MIN_SCORE or ranked[0] - runner_up < CLASSIFIER_MIN_MARGIN:
+        return None
+    return max(best, key=best.get)
+
+# --- 3. FIELD MATCHERS ---
+# Each matcher takes a lowercased segment and returns (value, span) or None
+def _regex_matcher(pattern, value=None):
+    compiled = re.compile(pattern)
+
+    def match(segment):
+        found = compiled.search(segment)
+        if not found:
+            return None
+        text = value(found) if callable(value) else (value or found.group(0).strip())
+        return text, found.span()
+    return match
+
+def _keyword_matcher(words, value=None):
+    return _regex_matcher(
+        r"\b(?:" + "|".join(sorted(map(re.escape, words), key=len, reverse=True)) + r")\b", value
+    )
+
+def _age_value(found):
+    number = next(g for g in found.groups() if g)
+    return f"{number} months" if "month" in found.group(0) else number
+
+ZONE_CUES = re.compile(r"\b(?:tier|zone|metro|city|town|rural|village)\b|" + "|".join(map(re.escape, TIER_1_CITIES)))
+OCCUPATION_CUES = re.compile(
+    r"\bclass\s*[123]\b|\b(?:" + "|".join(re.escape(w.strip()) for words in RISK_CLASS_KEYWORDS.values() for w in words) + r")"
+)
+VEHICLE_CUES = re.compile(r"\b(?:bike|scooter|two[\s-]wheeler|2 wheeler|motorcycle|truck|lorry|commercial|taxi|bus|goods|tempo|car|suv|sedan|hatchback|four wheeler|4 wheeler)\b")
+VEHICLE_LABELS = {"two_wheeler": "Two Wheeler", "private_car": "Private Car", "commercial": "Commercial Vehicle"}
+FAMILY_CUES = re.compile(
+    r"\b(?:\d+\s*)?(?:a(?:dults?)?|c|kids?|child(?:ren)?|sons?|daughters?|members|people|persons)\b(?:\s*\+\s*\d+\s*c\b)?"
+    r"|\b(?:wife|husband|spouse|couple|parents?|father|mother|family)\b"
+)
+
+SELF_CUES = re.compile(r"\b(?:me|myself|self|us|we|our)\b")
+
+def _zone(segment):
+    # The cue only anchors the span; parse_zone() reads the tier from the whole answer
+    cue = ZONE_CUES.search(segment)
+    zone = parse_zone(segment) if cue else None
+    return (f"Tier {int(zone)}", cue.span()) if zone else None
+
+def _occupation(segment):
+    cue = OCCUPATION_CUES.search(segment)
+    return (segment.strip().capitalize(), cue.span()) if cue else None
+
+def _vehicle(segment):
+    cue = VEHICLE_CUES.search(segment)
+    label = VEHICLE_LABELS.get(parse_vehicle_type(cue.group(0))) if cue else None
+    return (label, cue.span()) if label else None
+
+def _family(segment):
+    if re.fullmatch(r"(?:just |only )?(?:me|self|myself)(?: only)?|alone", segment):
+        return "Self", (0, len(segment))
+    cues = [m for m in FAMILY_CUES.finditer(segment) if m.group(0).strip() and not re.fullmatch(r"a|c", m.group(0).strip())]
+    if not cues:
+        return None
+    span = (cues[0].start(), cues[-1].end())
+    # "me and my wife": the proposer is part of the answer, not just the relatives named
+    for self_ref in SELF_CUES.finditer(segment):
+        span = (min(span[0], self_ref.start()), max(span[1], self_ref.end()))
+    return segment[span[0]:span[1]].strip(), span
+
+def _none_or_text(found):
+    return "None" if found.group(0) in ("no", "none", "nil", "nothing", "nope", "not applicable", "na") else found.string.strip().capitalize()
+
+AMOUNT_PATTERN = NUMBER_REGEX + r"\s*(?:crores?|cr|lakhs?|lacs?|l|k|thousand)\b|(?:rs\.?|₹|inr)\s*" + NUMBER_REGEX
+NONE_WORDS = ["no", "none", "nil", "nothing", "nope", "not applicable", "na"]
+
+FIELD_MATCHERS = {
+    "age": _regex_matcher(
+        r"\b(\d{1,3})\s*(?:years?|yrs?|y)\s*(?:old|of age)\b|\b(\d{1,2})\s*months?\s*old\b"
+        r"|\b(?:age(?:d)?|eldest(?: member)?(?: is)?)\s*(?:is|of|:|-)?\s*(\d{1,3})\b|\bi\s*(?:'m|’m|am)\s*(\d{1,3})\b", _age_value),
+    "amount": _regex_matcher(AMOUNT_PATTERN),
+    "zone": _zone,
+    "risk_zone": _regex_matcher(r"\b(?:high|medium|moderate|low)\s*(?:risk|hazard)\b|\b(?:flood|drought|cyclone|coastal|landslide|earthquake)[a-z\s-]*|\bzone\s*\d\b"),
+    "duration": _regex_matcher(r"\b(\d+)\s*(days?|weeks?|months?)\b(?!\s*old)"),
+    "count": _regex_matcher(r"\b(\d+)\s*(?:people|persons|members|employees|staff|workers|travell?ers|pax|students)\b"),
+    "area": _regex_matcher(r"\b\d+(?:\.\d+)?\s*(?:acres?|hectares?|ha|bighas?|birds|heads?|animals|cattle|cows|hens)\b"),
+    "engine": _regex_matcher(r"\b\d+(?:\.\d+)?\s*(?:cc|tons?|tonnes?|kg|gvw)\b"),
+    "year": _regex_matcher(r"\b(?:19[89]\d|20[0-4]\d)\b", lambda f: f.group(0) if int(f.group(0)) <= date.today().year else None),
+    "percent": _regex_matcher(r"\b(\d{1,2})\s*%|\bncb\s*(?:of|is|:)?\s*(\d{1,2})\b|\bno\s+(?:ncb|claim bonus)\b",
+                              lambda f: f"{f.group(1) or f.group(2) or 0}%"),
+    "tenure": _regex_matcher(r"\b(\d{1,2})\s*(?:-\s*)?(?:years?|yrs?)\b(?!\s*old)|\blong[\s-]*term\b|\bannual\b"),
+    "family": _family,
+    "occupation": _occupation,
+    "vehicle": _vehicle,
+    "species": _keyword_matcher(["dog", "cat", "cow", "buffalo", "horse", "goat", "sheep", "bird", "parrot", "rabbit", "pig", "camel", "puppy", "kitten"]),
+    "breed": _keyword_matcher(LARGE_BREEDS + AGGRESSIVE_BREEDS + ["pug", "beagle", "shih tzu", "pomeranian", "dachshund", "persian", "siamese", "indie", "desi", "mixed", "stray", "spitz", "cocker spaniel"]),
+    "disease": _keyword_matcher(NONE_WORDS + ["diabetes", "diabetic", "bp", "blood pressure", "hypertension", "asthma", "thyroid", "heart", "cancer", "kidney", "cholesterol"], _none_or_text),
+    "need": _keyword_matcher(NONE_WORDS + ["maternity", "opd", "outpatient", "critical illness", "dental", "wellness", "cashless"], _none_or_text),
+    "property": _keyword_matcher(["home", "house", "flat", "apartment", "villa", "bungalow", "shop", "office", "factory", "warehouse", "godown", "store", "restaurant", "hotel"]),
+    "security": _keyword_matcher(NONE_WORDS + ["cctv", "camera", "guard", "guards", "alarm", "grill", "grills", "lock", "locks", "gated", "security"], _none_or_text),
+    "financial": _keyword_matcher(["banking", "bank", "credit", "cyber", "fidelity", "guarantee", "fraud", "crime", "loan", "money", "transit", "cash"]),
+    "crop": _keyword_matcher(["wheat", "rice", "paddy", "cotton", "sugarcane", "maize", "tea", "coffee", "rubber", "soybean", "pulses", "mango", "banana", "apple", "vegetables", "fish", "shrimp", "prawn", "poultry", "chicken", "cattle", "cow", "buffalo", "goat", "sheep"]),
+    "item": _keyword_matcher(["jewellery", "jewelry", "jewels", "gold", "diamond", "laptop", "phone", "mobile", "camera", "electronics", "watch", "gadget", "tv"]),
+}
+
+# QUESTION_SCHEMAS field -> matcher kind
+FIELD_KINDS = {
+    "age": "age", "age_of_eldest_member": "age", "animal_age": "age", "item_age": "age",
+    "sum_insured_preference": "amount", "annual_income": "amount", "idv_preference": "amount",
+    "market_value_or_purchase_price": "amount", "input_cost_or_sum_insured": "amount",
+    "building_reconstruction_value": "amount", "contents_market_value": "amount",
+    "annual_turnover": "amount", "limit_of_liability": "amount", "invoice_value": "amount", "budget": "amount",
+    "city_tier": "zone", "location_risk_zone": "risk_zone", "travel_duration_days": "duration",
+    "group_size": "count", "number_of_employees": "count", "land_area_or_flock_size": "area",
+    "engine_cc_or_gvw": "engine", "registration_year": "year", "ncb_percentage": "percent",
+    "policy_tenure_preference": "tenure", "family_members_to_cover": "family",
+    "occupation_risk_class": "occupation", "occupation": "occupation", "vehicle_category": "vehicle",
+    "animal_species": "species", "animal_breed": "breed", "pre_existing_diseases": "disease",
+    "specific_need": "need", "property_type": "property", "security_measures": "security",
+    "financial_product_type": "financial", "crop_or_animal_type": "crop", "item_description": "item",
+}
+
+# Words that pin an amount to one field when a category asks for several amounts
+FIELD_HINTS = {
+    "annual_income": ["income", "salary", "earn"],
+    "budget": ["budget", "afford"],
+    "building_reconstruction_value": ["building", "construction", "structure"],
+    "contents_market_value": ["content", "contents", "belongings", "stock"],
+    "annual_turnover": ["turnover", "revenue", "sales"],
+    "limit_of_liability": ["limit", "liability"],
+    "idv_preference": ["idv"],
+    "invoice_value": ["invoice", "bill"],
+    "sum_insured_preference": ["sum insured", "cover", "coverage"],
+}
+
+# Bare numbers ("34", "20") are assigned in question order to the first field that can hold them
+BARE_NUMBER_RANGES = {
+    "age": (0, 120), "family": (1, 20), "count": (1, 100000), "percent": (0, 65), "tenure": (1, 10),
+    "year": (1980, date.today().year), "area": (0, 1e7), "engine": (50, 60000), "amount": (1000, 1e12),
+}
+BARE_NUMBER_SUFFIX = {"percent": "%", "tenure": " years", "engine": "cc", "family": " members"}
+
+# Free-text answers that can be taken verbatim when nothing else claims them
+FREE_TEXT_KINDS = {"occupation", "disease", "need", "property", "security", "financial", "crop", "item", "breed", "risk_zone", "species", "family"}
+
+# Words that mark an otherwise unrecognised answer as being about that field kind (on top of FIELD_MATCHERS)
+FREE_TEXT_CUES = {
+    kind: re.compile(r"\b(?:" + "|".join(words) + r")\b") for kind, words in {
+        "occupation": ["developer", "manager", "designer", "analyst", "consultant", "lawyer", "advocate", "nurse", "chef", "cook",
+                       "pilot", "farmer", "shopkeeper", "businessman", r"business\w*", r"self[\s-]employed", "homemaker",
+                       "housewife", "retired", "freelancer?", "professor", "lecturer", "tailor", "plumber", "carpenter",
+                       "executive", "officer", "worker", "employee", "technician", "professional", "police"],
+        "disease": [r"\w+itis", "disease", "disorder", "condition", "surgery", "syndrome", r"allerg\w*", "migraine",
+                    "pcod", "pcos", "epilepsy", "copd", "sugar", "stroke", "liver", "lung", r"obes\w*", "arthritis"],
+        "need": ["room rent", "ambulance", "ayush", r"restor\w*", r"check[\s-]?ups?", "icu", "daycare", "day care",
+                 "organ donor", "bariatric", "mental health", "home care", "newborn"],
+        "species": ["hamster", "fish", "turtle", "tortoise", "guinea pig", "ferret", "donkey", "mule", "duck", "hen", "pony"],
+        "breed": ["breed", "mix", "mixed breed", r"cross\w*", "terrier", "retriever", "shepherd", "spaniel", "hound",
+                  "poodle", "bulldog", "chihuahua", "maine coon", "bengal", "ragdoll", "jersey", "holstein", "gir", "sahiwal"],
+        "property": ["showroom", "clinic", "school", "hospital", "mall", "residential", "industrial", "building",
+                     "premises", "row house", "bhk"],
+        "security": ["watchman", "fire extinguishers?", "sprinklers?", "smoke detectors?", "safe", "vault", r"fenc\w*", "gate"],
+        "financial": ["card", "account", "upi", "wallet", "identity theft", "phishing", "dishonesty", "payments?"],
+        "crop": ["crops?", "farm", "orchard", "grains?", "fruits?", "millet", "bajra", "jowar", "groundnut", "mustard",
+                 "onion", "potato", "tomato", "livestock", "dairy", "hens", "birds", "ducks?"],
+        "item": ["ring", "necklace", "bangles?", "silver", "platinum", "tablet", "ipad", "iphone", "smartwatch",
+                 "console", "drone", "painting", "artwork"],
+        "risk_zone": ["prone", "hilly", "hills", "plains?", r"river\w*", "seismic", "urban", "rural", "safe area"],
+    }.items()
+}
+# A question or an unsure reply is never a profile answer ("which one is cheapest", "not sure")
+NON_ANSWER_REGEX = re.compile(
+    r"\?|^(?:what|which|how|why|when|where|who|can|could|does|do|is|are|will|would|should|tell|show|explain)\b"
+    r"|\b(?:not sure|no idea|don'?t know|dunno|help me|maybe|confused)\b"
+)
+
+def _segments(text):
+    # One segment per answer: split on commas/semicolons/new lines and strip "1." list markers
+    # (commas inside Indian-style amounts like 10,00,000 are kept)
+    parts = re.split(r"(?:,(?!\d{2,3}\b)|[;\n|])+", text.lower())
+    return [re.sub(r"^\s*\d+[.)]\s+", "", part).strip(" .!") for part in parts if part and part.strip(" .!")]
+
+def _overlaps(span, taken):
+    return any(span[0] < end and start < span[1] for start, end in taken)
+
+def _free_text_cue(kind, segment):
+    cues = FREE_TEXT_CUES.get(kind)
+    return bool(FIELD_MATCHERS[kind](segment) or (cues and cues.search(segment)))
+
+def extract_fields(text, fields, answered=(), positional=True, last_asked=None):
+    # -> (extracted {field: value}, leftover segments nobody could account for)
+    # Explicit matches may correct an answered field; positional guesses only fill open ones
+    # and are skipped when the text is not an answer to our questions (positional=False)
+
+    extracted = {}
+    leftovers = []
+    segments = _segments(text)
+
+    # Pass 1: explicit matches ("34 years old", "5 lakhs", "tier 2", "1200cc")
+    for segment in segments:
+        if FILLER_REGEX.match(segment):
+            continue
+        taken = []
+        ordered = sorted(
+            [f for f in fields if f in FIELD_KINDS],
+            key=lambda f: not any(re.search(rf"\b{re.escape(h)}", segment) for h in FIELD_HINTS.get(f, []))
+        )
+        for field in ordered:
+            if field in extracted:
+                continue
+            found = FIELD_MATCHERS[FIELD_KINDS[field]](segment)
+            if found and found[0] and not _overlaps(found[1], taken):
+                extracted[field] = found[0]
+                taken.append(found[1])
+        if not taken:
+            leftovers.append(segment)
+
+    if not positional:
+        return extracted, leftovers
+
+    # Pass 2: bare numbers, only where they cannot mean anything else: the one open field whose
+    # range fits, or the field we just asked about ("1" could be an age, a member count or a tenure)
+    remaining = []
+    for segment in leftovers:
+        bare = re.fullmatch(r"[^\d]{0,12}?" + NUMBER_REGEX + r"[^\d]{0,12}", segment)
+        field = None
+        if bare:
+            number = float(bare.group(1).replace(",", ""))
+            fits = [
+                candidate for candidate in fields
+                if candidate not in extracted and candidate not in answered
+                and FIELD_KINDS.get(candidate) in BARE_NUMBER_RANGES
+                and BARE_NUMBER_RANGES[FIELD_KINDS[candidate]][0] <= number <= BARE_NUMBER_RANGES[FIELD_KINDS[candidate]][1]
+            ]
+            field = last_asked if last_asked in fits else (fits[0] if len(fits) == 1 else None)
+            if field:
+                extracted[field] = bare.group(1) + BARE_NUMBER_SUFFIX.get(FIELD_KINDS[field], "")
+        if not field:
+            remaining.append(segment)
+
+    # Pass 3: short free-text answers ("rheumatoid arthritis", "golden doodle cross") go to the first
+    # open field whose kind they have a cue for; anything else is left for the LLM
+    open_fields = [f for f in fields if f not in extracted and f not in answered and FIELD_KINDS.get(f) in FREE_TEXT_KINDS]
+    unclaimed = []
+    for segment in remaining:
+        field = None
+        if len(segment.split()) <= 6 and not NON_ANSWER_REGEX.search(segment):
+            field = next((f for f in open_fields if f not in extracted and _free_text_cue(FIELD_KINDS[f], segment)), None)
+        if field:
+            extracted[field] = segment.capitalize()
+        else:
+            unclaimed.append(segment)
+    return extracted, unclaimed
+
+# --- 4. ROUTER ENTRY POINT ---
+def extract_locally(user_text, current_category, potential_fields=None, is_confirming_category=False,
+                    answering_questions=True, collected=None, last_asked=None):
+    # Same output shape as agents.classify_intent_and_extract, plus a confidence flag.
+    # When confident is False the caller should ask the LLM instead.
+
+    text = (user_text or "").strip().lower()
+    categories = detect_categories(text)
+    others = [c for c in categories if c != current_category]
+
+    if is_confirming_category:
+        said_yes = bool(YES_REGEX.match(text))
+        said_no = bool(NO_REGEX.match(text))
+        if len(others) == 1 and not said_yes:
+            return {"confirmed": False, "new_category": others[0], "extracted_data": {}}, True
+        if said_yes and not others:
+            return {"confirmed": True, "new_category": None, "extracted_data": {}}, True
+        if not said_no and not others and categories == [current_category]:
+            return {"confirmed": True, "new_category": None, "extracted_data": {}}, True
+        if not said_yes and not categories:
+            # No keyword either way: a "no" can only point elsewhere, anything else may be a yes
+            candidates = [c for c in CATEGORY_MAPPING if c != current_category] if said_no else None
+            guess = classify_category(text, candidates)
+            if guess == current_category:
+                return {"confirmed": True, "new_category": None, "extracted_data": {}}, True
+            if guess:
+                return {"confirmed": False, "new_category": guess, "extracted_data": {}}, True
+        return {}, False
+
+    analysis = {"switch_detected": False, "new_category": None, "extracted_data": {}}
+
+    if not current_category:
+        if len(categories) > 1:
+            # Several keywords ("travel cover for my pet"): let the classifier pick one of them
+            categories = [c for c in [classify_category(text, categories)] if c]
+            if not categories:
+                return analysis, False
+        if categories:
+            analysis.update(switch_detected=True, new_category=categories[0])
+            # Answers given up front ("health cover for me and my wife, I'm 45") are kept too
+            extracted, _ = extract_fields(text, get_required_fields(categories[0]), positional=False)
+            analysis["extracted_data"] = extracted
+            return analysis, True
+        extracted, leftovers = extract_fields(text, potential_fields or [])
+        if leftovers and not extracted:
+            # No keyword at all ("my laptop keeps getting stolen"): nearest category prototype
+            guess = classify_category(text)
+            if guess:
+                analysis.update(switch_detected=True, new_category=guess)
+                analysis["extracted_data"], _ = extract_fields(text, get_required_fields(guess), positional=False)
+                return analysis, True
+        analysis["extracted_data"] = extracted
+        return analysis, not leftovers and not extracted
+
+    if others:
+        # A keyword from another category is only a switch when it is asked for as such
+        if len(others) == 1 and asks_for_category(others[0], text):
+            analysis.update(switch_detected=True, new_category=others[0])
+            extracted, _ = extract_fields(text, get_required_fields(others[0]), positional=False)
+            analysis["extracted_data"] = extracted
+            return analysis, True
+        return analysis, False
+
+    if not answering_questions:
+        # After a recommendation the sales node handles the question itself
+        return analysis, True
+
+    extracted, leftovers = extract_fields(text, potential_fields or [], answered=collected or {}, last_asked=last_asked)
+    analysis["extracted_data"] = extracted
+    return analysis, not leftovers
@@ -0,0 +1,114 @@
+# lexical.py
+# In-process BM25 inverted index over whole policies, persisted next to the vector index.
+# Catches what MiniLM similarity misses: product names ("Arogya Sanjeevani"), acronyms ("PMSBY"), numbers.
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
+LEXICAL_FILE = "lexical_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "the", "to", "with", "this", "that", "will", "any", "all", "policy", "insurance",
+}
+
+def tokenize(text):
+    # "5,00,000" -> "500000"; "Jeweller's" -> "jeweller" (single letters are dropped, digits kept)
+    text = re.sub(r"(?<=\d),(?=\d)", "", str(text).lower())
+    return [t for t in TOKEN_RE.findall(text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+def title_terms(file_name):
+    # "Pradhan_Mantri_Suraksha_Bima_Yojana.pdf" -> its words plus the acronym "pmsby"
+    words = [w for w in re.split(r"[^a-z0-9]+", os.path.splitext(file_name)[0].lower()) if w]
+    terms = [w for w in words if w not in STOPWORDS]
+    if len(words) > 2:
+        terms.append("".join(w[0] for w in words))
+    return terms
+
+class LexicalIndex:
+    # docs: file_name -> {"category", "length", "terms": {term: frequency}}; postings are derived
+
+    def __init__(self, docs=None):
+        self.docs = docs or {}
+        self._postings = None
+
+    def add(self, file_name, category, texts):
+        # Title words count like body words, repeated so a named product wins its own query
+        counts = Counter(tok for text in texts for tok in tokenize(text))
+        for term in title_terms(file_name):
+            counts[term] += 3
+        self.docs[file_name] = {"category": category, "length": sum(counts.values()), "terms": dict(counts)}
+        self._postings = None
+
+    def remove(self, file_name):
+        if self.docs.pop(file_name, None) is not None:
+            self._postings = None
+
+    def postings(self):
+        if self._postings is None:
+            postings = {}
+            for file_name, doc in self.docs.items():
+                for term, frequency in doc["terms"].items():
+                    postings.setdefault(term, []).append((file_name, frequency))
+            self._postings = postings
+        return self._postings
+
+    def search(self, query, n=10, category=None):
+        # -> [(file_name, bm25 score)] best first; only documents sharing at least one term
+        if not self.docs:
+            return []
+        postings = self.postings()
+        total = len(self.docs)
+        avg_length = sum(doc["length"] for doc in self.docs.values()) / total or 1.0
+        scores = Counter()
+        for term in set(tokenize(query)):
+            matches = postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+            for file_name, frequency in matches:
+                doc = self.docs[file_name]
+                if category and doc["category"] != category:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc["length"] / avg_length)
+                scores[file_name] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores.most_common(n)
+
+    def save(self, persist_dir):
+
+        os.makedirs(persist_dir, exist_ok=True)
+        path = os.path.join(persist_dir, LEXICAL_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.docs, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, persist_dir):
+
+        path = os.path.join(persist_dir, LEXICAL_FILE)
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ Ignoring unreadable lexical index {path}: {e}")
+            return cls()
+
+def reciprocal_rank_fusion(rankings, k=60):
+    # rankings: lists of keys, best first -> keys ordered by sum of 1 / (k + rank)
+    scores = Counter()
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] += 1.0 / (k + rank)
+    return [key for key, _ in scores.most_common()]
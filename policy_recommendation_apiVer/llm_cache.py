@@ -0,0 +1,189 @@
+# llm_cache.py
+# Disk-backed response cache around the chat model: SQLite, TTL expiry, LRU size bound, hit/miss counters.
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from resources import run_blocking
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False")
+# Expiry/LRU sweep once every N writes instead of a COUNT(*) + DELETE on each one
+CACHE_EVICT_EVERY = int(os.getenv("LLM_CACHE_EVICT_EVERY", "100"))
+
+# Set on responses served from the cache, so a caller can tell its own call was a hit
+CACHE_HIT_KEY = "cache_hit"
+
+def normalize_prompt(prompt):
+    # f-string prompts differ only by indentation/blank lines depending on where they were built
+    lines = [re.sub(r"\s+", " ", line).strip() for line in str(prompt).splitlines()]
+    return "\n".join(line for line in lines if line)
+
+class CachedLLM:
+    # Drop-in wrapper: .invoke(prompt) returns a message with .content like the wrapped chat model
+
+    def __init__(self, llm, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.llm = llm
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.model = getattr(llm, "model", None) or getattr(llm, "model_name", type(llm).__name__)
+        self.temperature = getattr(llm, "temperature", None)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+            " created_at REAL, last_used REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+        self._conn.commit()
+
+    def __getattr__(self, name):
+        # Anything not cached (bind, stream, ...) goes straight to the wrapped model
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def make_key(self, prompt):
+        payload = json.dumps(
+            {"model": self.model, "temperature": self.temperature, "prompt": normalize_prompt(prompt)},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, content):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                (key, self.model, content, now, now)
+            )
+            self._puts += 1
+            if self._puts % CACHE_EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # LRU bound: drop expired rows first, then the least recently used beyond max_entries
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - self.max_entries
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def invoke(self, prompt, *args, **kwargs):
+        if args or kwargs or not isinstance(prompt, str):
+            return self.llm.invoke(prompt, *args, **kwargs)
+        key = self.make_key(prompt)
+        cached = self.get(key)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={CACHE_HIT_KEY: True})
+        response = self.llm.invoke(prompt)
+        if isinstance(response.content, str) and response.content.strip():
+            self.put(key, response.content)
+        return response
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        # SQLite reads/writes run on the worker pool, never on the event loop
+        if args or kwargs or not isinstance(prompt, str):
+            return await self.llm.ainvoke(prompt, *args, **kwargs)
+        key = self.make_key(prompt)
+        cached = await run_blocking(self.get, key)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={CACHE_HIT_KEY: True})
+        response = await self.llm.ainvoke(prompt)
+        if isinstance(response.content, str) and response.content.strip():
+            await run_blocking(self.put, key, response.content)
+        return response
+
+    def stream(self, prompt, *args, **kwargs):
+        # A hit comes back as one chunk; a miss is streamed through and stored once complete
+        if args or kwargs or not isinstance(prompt, str):
+            yield from self.llm.stream(prompt, *args, **kwargs)
+            return
+        key = self.make_key(prompt)
+        cached = self.get(key)
+        if cached is not None:
+            yield AIMessageChunk(content=cached, response_metadata={CACHE_HIT_KEY: True})
+            return
+        parts = []
+        for chunk in self.llm.stream(prompt):
+            if isinstance(chunk.content, str):
+                parts.append(chunk.content)
+            yield chunk
+        content = "".join(parts)
+        if content.strip():
+            self.put(key, content)
+
+    async def astream(self, prompt, *args, **kwargs):
+        if args or kwargs or not isinstance(prompt, str):
+            async for chunk in self.llm.astream(prompt, *args, **kwargs):
+                yield chunk
+            return
+        key = self.make_key(prompt)
+        cached = await run_blocking(self.get, key)
+        if cached is not None:
+            yield AIMessageChunk(content=cached, response_metadata={CACHE_HIT_KEY: True})
+            return
+        parts = []
+        async for chunk in self.llm.astream(prompt):
+            if isinstance(chunk.content, str):
+                parts.append(chunk.content)
+            yield chunk
+        content = "".join(parts)
+        if content.strip():
+            await run_blocking(self.put, key, content)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+def with_cache(llm):
+    # LLM_CACHE_ENABLED=0 turns the cache off without touching the call sites
+    return CachedLLM(llm) if CACHE_ENABLED else llm
@@ -0,0 +1,162 @@
+# onnx_embeddings.py
+# all-MiniLM-L6-v2 on ONNX Runtime with the int8-quantized export published in the model repo, instead of
+# sentence-transformers on PyTorch: same LangChain interface and vector space, faster start-up, queries and
+# ingestion, and far less RAM on CPU-only nodes. Selected with EMBEDDING_BACKEND=onnx (see resources.py).
+# `python onnx_embeddings.py` checks parity against the PyTorch vectors on real policy text.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from telemetry import get_logger, span
+
+log = get_logger(__name__)
+
+# Quantized weights for x86 with AVX2 (quint8); "onnx/model_qint8_arm64.onnx" on ARM, "onnx/model.onnx" = fp32
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "onnx/model_quint8_avx2.onnx")
+# Folder holding tokenizer.json + ONNX_MODEL_FILE for offline nodes; unset = fetched from the Hugging Face hub once
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR")
+# Short policy chunks: larger batches stop paying off around 32 on a few cores
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+# Threads per inference; 0 = ONNX Runtime default (one per physical core)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+# Same truncation as the sentence-transformers config of this model
+MAX_SEQ_LENGTH = 256
+PARITY_MIN_COSINE = float(os.getenv("PARITY_MIN_COSINE", "0.99"))
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    # Tokenize -> transformer (ONNX) -> mean pooling over real tokens -> L2 normalize,
+    # i.e. the sentence-transformers pipeline of all-MiniLM-L6-v2
+
+    def __init__(self, model_name, model_file=ONNX_MODEL_FILE, model_dir=ONNX_MODEL_DIR,
+                 batch_size=ONNX_BATCH_SIZE, threads=ONNX_THREADS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        tokenizer_path, model_path = self._resolve(model_name, model_file, model_dir)
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        # Pads each batch to its longest text only
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        outputs = [node.name for node in self.session.get_outputs()]
+        self.output_name = "last_hidden_state" if "last_hidden_state" in outputs else outputs[0]
+        log.info(f"🧩 ONNX embeddings: {model_name}/{model_file} (batch={batch_size}, threads={threads or 'auto'})")
+
+    @staticmethod
+    def _resolve(model_name, model_file, model_dir):
+
+        if model_dir:
+            return os.path.join(model_dir, "tokenizer.json"), os.path.join(model_dir, model_file)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, "tokenizer.json"), hf_hub_download(model_name, model_file)
+
+    def _embed_batch(self, texts):
+
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64), "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run([self.output_name], feed)[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        # Newlines flattened like HuggingFaceEmbeddings; batches of similar length (less padding),
+        # vectors returned in input order
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        with span("embed.onnx", texts=len(texts)):
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                    vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+# --- PARITY CHECK ---
+def check_parity(texts, reference, candidate):
+    # -> cosine between the two backends' vectors per text, and whether each text keeps its
+    # nearest neighbour (what retrieval actually depends on)
+    timings = {}
+    vectors = {}
+    for name, embeddings in (("reference", reference), ("candidate", candidate)):
+        started = time.perf_counter()
+        vectors[name] = np.asarray(embeddings.embed_documents(texts), dtype=float)
+        timings[name] = round(time.perf_counter() - started, 3)
+
+    ref, cand = vectors["reference"], vectors["candidate"]
+    ref = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+    cand = cand / np.linalg.norm(cand, axis=1, keepdims=True)
+    cosines = (ref * cand).sum(axis=1)
+
+    agreement = None
+    if len(texts) > 1:
+        ref_sim, cand_sim = ref @ ref.T, cand @ cand.T
+        np.fill_diagonal(ref_sim, -np.inf)
+        np.fill_diagonal(cand_sim, -np.inf)
+        agreement = float(np.mean(ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1)))
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosines.min()), 5),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "neighbour_agreement": None if agreement is None else round(agreement, 4),
+        "seconds": timings,
+    }
+
+def policy_texts(folder, limit):
+    # Real chunks, as ingestion produces them
+    from utils import list_policy_files, parse_policy_file
+    texts = []
+    for file_path in list_policy_files(folder):
+        _, chunks, _, _ = parse_policy_file(file_path)
+        texts.extend(chunks)
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+def main(argv=None):
+
+    from resources import EMBEDDING_MODEL, POLICY_FOLDER, build_embeddings
+
+    parser = argparse.ArgumentParser(description="Compare ONNX (int8) MiniLM vectors with the PyTorch ones")
+    parser.add_argument("--policies", default=POLICY_FOLDER, help="Folder of policy PDFs/TXTs to sample chunks from")
+    parser.add_argument("--limit", type=int, default=200, help="Number of chunks to compare")
+    parser.add_argument("--model-file", default=ONNX_MODEL_FILE, help="ONNX file inside the model repo / ONNX_MODEL_DIR")
+    parser.add_argument("--min-cosine", type=float, default=PARITY_MIN_COSINE, help="Fail below this per-text cosine")
+    args = parser.parse_args(argv)
+
+    texts = policy_texts(args.policies, args.limit)
+    if not texts:
+        print(f"No policy text found in '{args.policies}'")
+        return 1
+    report = check_parity(texts, build_embeddings("torch"), OnnxMiniLMEmbeddings(EMBEDDING_MODEL, model_file=args.model_file))
+    print(f"🔬 Parity over {report['texts']} chunks: min cosine {report['min_cosine']}, mean {report['mean_cosine']}, "
+          f"nearest-neighbour agreement {report['neighbour_agreement']}")
+    print(f"⏱️ PyTorch {report['seconds']['reference']}s vs ONNX {report['seconds']['candidate']}s")
+    if report["min_cosine"] < args.min_cosine:
+        print(f"❌ Below {args.min_cosine}: keep EMBEDDING_BACKEND=torch or try another --model-file")
+        return 1
+    print("✅ ONNX vectors match")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
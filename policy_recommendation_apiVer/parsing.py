@@ -0,0 +1,254 @@
+# parsing.py
+# Turns free-text profile values ("5 Lakhs", "Tier 2", "2A+1C") into plain numbers/labels.
+import re
+from datetime import date
+
+NUMBER_REGEX = r"(\d+(?:,\d+)*(?:\.\d+)?)"
+
+AMOUNT_UNITS = {
+    "crore": 10000000, "crores": 10000000, "cr": 10000000,
+    "lakh": 100000, "lakhs": 100000, "lac": 100000, "lacs": 100000, "l": 100000,
+    "thousand": 1000, "k": 1000
+}
+
+TIER_1_CITIES = [
+    "mumbai", "delhi", "new delhi", "bangalore", "bengaluru", "chennai", "kolkata",
+    "hyderabad", "pune", "ahmedabad", "metro"
+]
+
+RISK_CLASS_KEYWORDS = {
+    1: ["office", "admin", "doctor", "teacher", "student", "architect", "engineer", "desk", "accountant", "it ", "software", "banker", "clerk"],
+    2: ["sales", "field", "site", "supervisor", "marketing", "agent", "veterinar"],
+    3: ["manual", "labour", "labor", "driver", "mechanic", "construction", "factory", "miner", "electrician", "welder"]
+}
+
+LARGE_BREEDS = [
+    "labrador", "golden retriever", "german shepherd", "rottweiler", "great dane", "doberman",
+    "boxer", "husky", "mastiff", "saint bernard", "st bernard", "alsatian", "large", "giant"
+]
+
+AGGRESSIVE_BREEDS = ["pit bull", "pitbull", "rottweiler", "doberman", "bull terrier", "mastiff", "aggressive"]
+
+YES_WORDS = ["yes", "y", "yeah", "yep", "sure", "true", "ok", "okay", "opted", "required", "want"]
+NO_WORDS = ["no", "n", "nope", "false", "none", "not required", "don't", "dont"]
+
+
+def _text(value):
+    return str(value).strip().lower() if value is not None else ""
+
+def parse_number(value):
+
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(NUMBER_REGEX, _text(value))
+    if not match:
+        return None
+    return float(match.group(1).replace(",", ""))
+
+def parse_amount(value):
+    # "5 Lakhs" -> 500000, "1.5 cr" -> 15000000, "Rs 50,000" -> 50000, "50k" -> 50000
+
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = _text(value)
+    match = re.search(NUMBER_REGEX + r"\s*([a-z]+)?", text)
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", ""))
+    unit = match.group(2)
+    if unit in AMOUNT_UNITS:
+        amount *= AMOUNT_UNITS[unit]
+    return amount
+
+def parse_years(value):
+    # Ages are counted in completed years; anything under a year stays fractional ("6 months" -> 0.5)
+
+    number = parse_number(value)
+    if number is None:
+        return None
+    text = _text(value)
+    if re.search(r"months?\b|\d\s*m\b", text):
+        number = number / 12.0
+    elif re.search(r"\bweeks?\b", text):
+        number = number / 52.0
+    return float(int(number)) if number >= 1 else round(number, 2)
+
+def parse_duration_days(value):
+
+    number = parse_number(value)
+    if number is None:
+        return None
+    text = _text(value)
+    if "week" in text:
+        number *= 7
+    elif "month" in text:
+        number *= 30
+    elif "year" in text or "annual" in text:
+        number *= 365
+    return float(int(number))
+
+def parse_tenure_years(value):
+
+    number = parse_number(value)
+    if number is None:
+        return None
+    if "month" in _text(value):
+        return max(1.0, round(number / 12.0))
+    return float(int(number))
+
+def parse_vehicle_age(value):
+    # Accepts a registration year ("2019") or an age ("3 years")
+
+    number = parse_number(value)
+    if number is None:
+        return None
+    if 1900 <= number <= date.today().year:
+        return float(date.today().year - int(number))
+    return float(int(number))
+
+def parse_percent(value):
+
+    number = parse_number(value)
+    return None if number is None else float(number)
+
+def parse_zone(value):
+
+    text = _text(value)
+    if not text:
+        return None
+    match = re.search(r"(?:tier|zone)\s*[-:]?\s*([123])", text)
+    if match:
+        return float(match.group(1))
+    if any(city in text for city in TIER_1_CITIES):
+        return 1.0
+    if text in ("1", "2", "3"):
+        return float(text)
+    if "rural" in text or "village" in text or "rest of" in text:
+        return 3.0
+    return 2.0 if "city" in text or "town" in text else None
+
+def parse_risk_class(value):
+
+    text = _text(value)
+    if not text:
+        return None
+    match = re.search(r"(?:class|group)\s*[-:]?\s*([123])", text)
+    if match:
+        return float(match.group(1))
+    if text in ("1", "2", "3"):
+        return float(text)
+    for risk_class, keywords in RISK_CLASS_KEYWORDS.items():
+        if any(word in f"{text} " for word in keywords):
+            return float(risk_class)
+    return None
+
+def parse_family(value):
+    # Returns (adults, children): "2A+1C" -> (2, 1), "me, wife and 2 kids" -> (2, 2), "4" -> (4, 0)
+
+    text = _text(value)
+    if not text:
+        return None, None
+    match = re.search(r"(\d+)\s*a(?:dults?)?\b\s*(?:\+|and|,)?\s*(?:(\d+)\s*c(?:hild(?:ren)?)?\b)?", text)
+    if match:
+        return float(match.group(1)), float(match.group(2) or 0)
+
+    children = 0
+    match = re.search(r"(\d+)\s*(?:kids?|child(?:ren)?|sons?|daughters?)", text)
+    if match:
+        children = int(match.group(1))
+    elif re.search(r"\b(?:kid|child|son|daughter)\b", text):
+        children = 1
+    adults = 1
+    if re.search(r"\b(?:wife|husband|spouse|partner|couple)\b", text):
+        adults = 2
+    adults += len(re.findall(r"\b(?:father|mother|parent|dad|mom)\b", text))
+    adults += 2 * len(re.findall(r"\bparents\b", text))
+    if adults == 1 and children == 0:
+        number = parse_number(text)
+        if number and ("self" not in text):
+            return float(number), 0.0
+    return float(adults), float(children)
+
+def parse_vehicle_type(value):
+
+    text = _text(value)
+    if not text:
+        return None
+    if any(word in text for word in ["bike", "scooter", "two wheeler", "two-wheeler", "2 wheeler", "motorcycle", "2w"]):
+        return "two_wheeler"
+    if any(word in text for word in ["truck", "lorry", "commercial", "taxi", "bus", "goods", "tempo", "ambulance", "crane", "excavator"]):
+        return "commercial"
+    if any(word in text for word in ["car", "suv", "sedan", "hatchback", "four wheeler", "4 wheeler", "4w"]):
+        return "private_car"
+    return text
+
+def parse_engine(value):
+    # "1200cc" -> ("engine_cc", 1200); "10 ton" -> ("gvw_kg", 10000); bare numbers above 3000 are GVW in kg
+
+    number = parse_number(value)
+    if number is None:
+        return None, None
+    text = _text(value)
+    if "ton" in text:
+        return "gvw_kg", number * 1000
+    if "kg" in text or "gvw" in text:
+        return "gvw_kg", number
+    if "cc" in text or number <= 3000:
+        return "engine_cc", number
+    return "gvw_kg", number
+
+def parse_bool(value):
+
+    if isinstance(value, bool):
+        return value
+    text = _text(value)
+    if not text:
+        return None
+    if any(text == word or text.startswith(word + " ") for word in NO_WORDS):
+        return False
+    if any(text == word or text.startswith(word + " ") for word in YES_WORDS):
+        return True
+    return None
+
+def parse_breed_size(value):
+
+    text = _text(value)
+    if not text:
+        return None
+    if any(breed in text for breed in LARGE_BREEDS):
+        return "large"
+    return "small"
+
+def parse_aggressive_breed(value):
+
+    text = _text(value)
+    if not text:
+        return None
+    return any(breed in text for breed in AGGRESSIVE_BREEDS)
+
+# Only tenure phrasing ("for 3 years", "2 year premium"), never an age ("I'm 45 years old")
+TENURE_REGEX = re.compile(
+    r"(?:\b(?:for|about|over|with|to|make it)\s+(\d+)\s*(?:-\s*)?(?:years?|yrs?)\b"
+    r"|\b(\d+)\s*(?:-\s*)?(?:years?|yrs?)\s*(?:policy|policies|plan|plans|term|tenure|premium|cover|coverage|package|option|quote)\b)"
+    r"(?!\s*(?:old|of age))"
+)
+
+def extract_quote_overrides(text):
+    # Terms a follow-up question can change on an existing quote: "2 year premium", "for 30 days", "with 10 lakhs"
+
+    text = _text(text)
+    overrides = {}
+    match = TENURE_REGEX.search(text)
+    if match:
+        overrides["tenure_years"] = float(match.group(1) or match.group(2))
+    match = re.search(r"(\d+)\s*(?:-\s*)?(days?|weeks?|months?)\b(?!\s*old)", text)
+    if match:
+        overrides["duration_days"] = parse_duration_days(match.group(0))
+    match = re.search(NUMBER_REGEX + r"\s*(crores?|cr|lakhs?|lacs?|l)\b", text)
+    if match:
+        overrides["sum_insured"] = parse_amount(match.group(0))
+    return overrides
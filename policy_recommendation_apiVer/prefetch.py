@@ -0,0 +1,90 @@
+# prefetch.py
+# Speculative retrieval: while the collector is still asking for fields, the policy candidates for the
+# profile so far are fetched in the background; the analyst only re-ranks them for the final profile.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, TimeoutError
+
+from resources import get_executor, get_vectorstore
+from telemetry import get_logger, incr, span
+
+log = get_logger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH", "1") in ("1", "true", "True")
+# Candidates per prefetch (a whole category partition, typically): the partial profile only has to
+# get the right policies into the set, the final profile re-ranks them
+PREFETCH_CANDIDATES = int(os.getenv("PREFETCH_CANDIDATES", "16"))
+# How long the analyst waits for a prefetch that is still running before searching itself
+PREFETCH_WAIT_SECONDS = float(os.getenv("PREFETCH_WAIT_SECONDS", "1.0"))
+PREFETCH_CACHE_SIZE = int(os.getenv("PREFETCH_CACHE_SIZE", "256"))
+
+# prefetch key -> (category, Future of (index handle, candidates)); shared by all sessions,
+# the key is derived from the profile so identical profiles share one fetch
+_lock = threading.Lock()
+_pending = OrderedDict()
+
+def analyst_query(category, collected):
+    # The search text the analyst uses for a profile
+    query = f"{category} insurance policy features coverage"
+    for val in (collected or {}).values():
+        query += f" {val}"
+    return query
+
+def prefetch_key(category, collected):
+    payload = json.dumps([category, sorted((collected or {}).items())], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _fetch_candidates(category, query):
+
+    vectorstore = get_vectorstore()
+    if not vectorstore:
+        return None, None
+    with span("prefetch.retrieval", category=category):
+        return vectorstore, vectorstore.policy_candidates(query, PREFETCH_CANDIDATES, category)
+
+def start_prefetch(category, collected):
+    # -> key to keep in the state (None when disabled); returns at once, the fetch runs on the worker pool
+    if not PREFETCH_ENABLED or not category or not collected:
+        return None
+    key = prefetch_key(category, collected)
+    with _lock:
+        entry = _pending.get(key)
+        if entry is None or entry[1].cancelled():
+            future = get_executor().submit(_fetch_candidates, category, analyst_query(category, collected))
+            _pending[key] = (category, future)
+            incr("prefetch_total", result="started")
+        _pending.move_to_end(key)
+        while len(_pending) > PREFETCH_CACHE_SIZE:
+            _pending.popitem(last=False)
+    return key
+
+def take_prefetched(key, category, vectorstore):
+    # -> candidates fetched for this category from this index handle, or None (search normally)
+    with _lock:
+        entry = _pending.get(key) if key else None
+    if entry is None or entry[0] != category:
+        incr("prefetch_total", result="miss")
+        return None
+    future = entry[1]
+    # Still queued behind other work: searching now is faster than waiting for a worker
+    if future.cancel():
+        incr("prefetch_total", result="queued")
+        return None
+    try:
+        handle, candidates = future.result(timeout=PREFETCH_WAIT_SECONDS)
+    except (TimeoutError, CancelledError):
+        incr("prefetch_total", result="late")
+        return None
+    except Exception as e:
+        log.warning(f"⚠️ Prefetch failed, searching again: {e}")
+        incr("prefetch_total", result="error")
+        return None
+    # Re-indexed meanwhile: candidates point at the old handle
+    if handle is not vectorstore or not candidates:
+        incr("prefetch_total", result="stale")
+        return None
+    incr("prefetch_total", result="hit")
+    return candidates
@@ -0,0 +1,559 @@
+# pricing.py
+# Deterministic premium engine: the structured "pricing" block of each entry in
+# policy_rules.json is compiled once into typed rate tables and evaluated in Python.
+# The LLM only narrates the resulting quotes; it never does the arithmetic.
+import json
+import operator
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from parsing import (
+    parse_amount, parse_number, parse_years, parse_duration_days, parse_tenure_years,
+    parse_vehicle_age, parse_percent, parse_zone, parse_risk_class, parse_family,
+    parse_vehicle_type, parse_engine, parse_bool, parse_breed_size, parse_aggressive_breed
+)
+
+RULES_FILE = "policy_rules.json"
+DEFAULT_GST = 0.18
+
+class PricingError(ValueError):
+    """Raised when a pricing block in policy_rules.json is malformed."""
+
+class NotQuotable(Exception):
+    """Raised while evaluating a quote when the profile falls outside the rate tables."""
+
+# --- 1. PROFILE NORMALIZATION ---
+# Canonical pricing input <- collected_data keys (from QUESTION_SCHEMAS), first non-empty wins
+PROFILE_ALIASES = {
+    "age": ["age", "age_of_eldest_member"],
+    "sum_insured": ["sum_insured", "sum_insured_preference", "input_cost_or_sum_insured"],
+    "zone": ["zone", "city_tier"],
+    "risk_class": ["risk_class", "occupation_risk_class", "occupation"],
+    "annual_income": ["annual_income"],
+    "duration_days": ["duration_days", "travel_duration_days"],
+    "group_size": ["group_size"],
+    "vehicle_type": ["vehicle_type", "vehicle_category"],
+    "vehicle_age": ["vehicle_age", "registration_year"],
+    "idv": ["idv", "idv_preference"],
+    "ncb_percent": ["ncb_percent", "ncb_percentage"],
+    "tenure_years": ["tenure_years", "policy_tenure_preference"],
+    "species": ["species", "animal_species"],
+    "pet_age": ["pet_age", "animal_age"],
+    "market_value": ["market_value", "market_value_or_purchase_price", "input_cost_or_sum_insured"],
+    "crop_type": ["crop_type", "crop_or_animal_type"],
+    "insured_value": ["insured_value", "input_cost_or_sum_insured", "sum_insured_preference"],
+    "risk_zone": ["risk_zone", "location_risk_zone"],
+    "property_type": ["property_type"],
+    "building_value": ["building_value", "building_reconstruction_value"],
+    "contents_value": ["contents_value", "contents_market_value"],
+    "security": ["security", "security_measures"],
+    "product_type": ["product_type", "financial_product_type"],
+    "turnover": ["turnover", "annual_turnover"],
+    "limit": ["limit", "limit_of_liability", "sum_insured_preference"],
+    "loan_amount": ["loan_amount", "limit_of_liability", "sum_insured_preference"],
+    "employees": ["employees", "number_of_employees"],
+    "branches": ["branches", "number_of_branches"],
+    "item_type": ["item_type", "item_description"],
+    "item_value": ["item_value", "invoice_value"],
+    "item_age": ["item_age"],
+    "specific_need": ["specific_need"],
+}
+
+PROFILE_PARSERS = {
+    "age": parse_years,
+    "sum_insured": parse_amount,
+    "zone": parse_zone,
+    "risk_class": parse_risk_class,
+    "annual_income": parse_amount,
+    "duration_days": parse_duration_days,
+    "group_size": parse_number,
+    "vehicle_type": parse_vehicle_type,
+    "vehicle_age": parse_vehicle_age,
+    "idv": parse_amount,
+    "ncb_percent": parse_percent,
+    "tenure_years": parse_tenure_years,
+    "pet_age": parse_years,
+    "market_value": parse_amount,
+    "insured_value": parse_amount,
+    "building_value": parse_amount,
+    "contents_value": parse_amount,
+    "turnover": parse_amount,
+    "limit": parse_amount,
+    "loan_amount": parse_amount,
+    "employees": parse_number,
+    "branches": parse_number,
+    "item_value": parse_amount,
+    "item_age": parse_years,
+}
+
+# Raw keys that are consumed above and must not leak through as pricing inputs
+SOURCE_KEYS = {key for keys in PROFILE_ALIASES.values() for key in keys} | {
+    "family_members_to_cover", "engine_cc_or_gvw", "animal_breed", "pre_existing_diseases",
+    "budget", "land_area_or_flock_size"
+}
+
+def normalize_profile(collected):
+
+    raw = raw_profile(collected)
+    inputs = {}
+
+    for canonical, keys in PROFILE_ALIASES.items():
+        for key in keys:
+            if key not in raw:
+                continue
+            value = normalize_input(canonical, raw[key])
+            if value is not None:
+                inputs[canonical] = value
+                break
+    return derive_inputs(raw, inputs)
+
+def raw_profile(collected):
+    return {str(k).lower(): v for k, v in (collected or {}).items() if v not in (None, "")}
+
+def normalize_input(canonical, value):
+    parser = PROFILE_PARSERS.get(canonical)
+    return parser(value) if parser else str(value).strip().lower()
+
+def derive_inputs(raw, inputs):
+    # Derived inputs that several rate tables share
+    if "family_members_to_cover" in raw:
+        adults, children = parse_family(raw["family_members_to_cover"])
+        if adults is not None:
+            inputs["adults"] = adults
+            inputs["children"] = children
+    if "adults" in inputs:
+        inputs["members"] = inputs["adults"] + inputs["children"]
+        inputs["extra_adults"] = max(inputs["adults"] - 1, 0.0)
+    if "engine_cc_or_gvw" in raw:
+        key, value = parse_engine(raw["engine_cc_or_gvw"])
+        if key:
+            inputs[key] = value
+    if "animal_breed" in raw:
+        inputs["breed_size"] = parse_breed_size(raw["animal_breed"])
+        inputs["aggressive_breed"] = parse_aggressive_breed(raw["animal_breed"])
+        inputs.setdefault("breed", str(raw["animal_breed"]).strip().lower())
+    if "asset_value" not in inputs and ("building_value" in inputs or "contents_value" in inputs):
+        inputs["asset_value"] = inputs.get("building_value", 0.0) + inputs.get("contents_value", 0.0)
+    if "turnover" in inputs:
+        inputs["revenue_cr"] = inputs["turnover"] / 10000000.0
+    if "specific_need" in inputs:
+        inputs["critical_illness"] = "critical" in inputs["specific_need"]
+
+    # Pricing-only inputs (plan, add-on flags...) can be passed straight through by name
+    for key, value in raw.items():
+        if key not in inputs and key not in SOURCE_KEYS and not isinstance(value, (dict, list)):
+            boolean = parse_bool(value) if isinstance(value, str) else None
+            inputs[key] = boolean if boolean is not None else value
+    return inputs
+
+# --- 2. COMPILED RATE TABLES ---
+CONDITION_OPS = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne,
+    "has": lambda value, word: word in str(value).lower(),
+}
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _as_number(value):
+    if _is_number(value):
+        return float(value)
+    number = parse_number(value)
+    return number
+
+def _fmt_key(value):
+    return f"{value:,.0f}" if _is_number(value) and float(value).is_integer() else str(value)
+
+class _Inputs:
+    # Profile + policy defaults, remembering which inputs were read and which were assumed
+
+    def __init__(self, provided, defaults, allowed):
+        self.provided = provided
+        self.defaults = defaults
+        self.allowed = allowed
+        self.used = {}
+        self.assumed = set()
+
+    def get(self, name):
+        if name in self.provided:
+            value = self.provided[name]
+        elif name in self.defaults and self.defaults[name] is not None:
+            value = self.defaults[name]
+            self.assumed.add(name)
+        else:
+            raise NotQuotable(f"needs '{name}' to quote")
+        allowed = self.allowed.get(name)
+        if allowed:
+            # Answers and overrides arrive as text ("60"): numeric options are compared as numbers,
+            # the same way bulk_pricing checks them
+            if all(_is_number(a) for a in allowed):
+                number = _as_number(value)
+                offered = number is not None and number in [float(a) for a in allowed]
+                value = number if offered else value
+            else:
+                offered = str(value) in [str(a) for a in allowed]
+            if not offered:
+                raise NotQuotable(f"{name} {_fmt_key(value)} not offered (options: {', '.join(_fmt_key(a) for a in allowed)})")
+        self.used[name] = value
+        return value
+
+@dataclass(frozen=True)
+class Constant:
+    amount: float
+
+    def evaluate(self, inputs):
+        return self.amount, ""
+
+@dataclass(frozen=True)
+class BandTable:
+    # Inclusive [low, high] bands, first match wins; high=None means open-ended
+    on: str
+    bands: Tuple[Tuple[float, Optional[float], Any], ...]
+    by: Optional[str] = None
+
+    def evaluate(self, inputs):
+        x = _as_number(inputs.get(self.on))
+        if x is None:
+            raise NotQuotable(f"'{self.on}' is not a number")
+        for low, high, value in self.bands:
+            if x >= low and (high is None or x <= high):
+                band = f"{_fmt_key(low)}+" if high is None else f"{_fmt_key(low)}-{_fmt_key(high)}"
+                if self.by is None:
+                    return value, f"{self.on} {band}"
+                choice, key = value.lookup(inputs.get(self.by))
+                return choice, f"{self.on} {band}, {self.by} {key}"
+        raise NotQuotable(f"{self.on} {_fmt_key(x)} is outside the rate table")
+
+@dataclass(frozen=True)
+class ChoiceTable:
+    # Exact key match first, then keyword containment for free text ("milch cow" -> "cow")
+    on: Optional[str]
+    choices: Tuple[Tuple[Any, float], ...]
+    fallback: Optional[float] = None
+    numeric: bool = False
+
+    def lookup(self, raw):
+        if self.numeric:
+            key = _as_number(raw)
+            for choice, value in self.choices:
+                if key is not None and abs(choice - key) < 1e-9:
+                    return value, _fmt_key(choice)
+        else:
+            key = str(raw).strip().lower()
+            for choice, value in self.choices:
+                if key == choice:
+                    return value, choice
+            for choice, value in self.choices:
+                if choice in key:
+                    return value, choice
+        if self.fallback is not None:
+            return self.fallback, f"{_fmt_key(raw)} (standard)"
+        options = ", ".join(_fmt_key(choice) for choice, _ in self.choices)
+        raise NotQuotable(f"{self.on or 'option'} '{_fmt_key(raw)}' not in rate table (options: {options})")
+
+    def evaluate(self, inputs):
+        value, key = self.lookup(inputs.get(self.on))
+        return value, f"{self.on} {key}"
+
+@dataclass(frozen=True)
+class Linear:
+    # const + sum(coefficient * input)
+    const: float
+    terms: Tuple[Tuple[str, float], ...]
+
+    def evaluate(self, inputs):
+        total = self.const
+        parts = []
+        for name, coefficient in self.terms:
+            value = _as_number(inputs.get(name))
+            if value is None:
+                raise NotQuotable(f"'{name}' is not a number")
+            total += coefficient * value
+            parts.append(f"{name}={_fmt_key(value)}")
+        return total, ", ".join(parts)
+
+@dataclass(frozen=True)
+class Condition:
+    input: str
+    op: str
+    value: Any
+
+    def holds(self, inputs):
+        actual = inputs.get(self.input)
+        if self.op != "has" and _is_number(self.value):
+            actual = _as_number(actual)
+            if actual is None:
+                return False
+        return CONDITION_OPS[self.op](actual, self.value)
+
+@dataclass(frozen=True)
+class Base:
+    value: Any
+    per: Optional[float] = None
+    of: Optional[str] = None
+
+    def evaluate(self, inputs):
+        rate, detail = self.value.evaluate(inputs)
+        if not self.of:
+            return rate, f"₹{rate:,.0f}" + (f" ({detail})" if detail else "")
+        basis = _as_number(inputs.get(self.of))
+        if basis is None:
+            raise NotQuotable(f"'{self.of}' is not an amount")
+        amount = basis / self.per * rate
+        text = f"({self.of} ₹{basis:,.0f} / {self.per:,.0f}) x {rate:g} = ₹{amount:,.2f}"
+        return amount, text + (f" ({detail})" if detail else "")
+
+@dataclass(frozen=True)
+class Step:
+    label: str
+    kind: str
+    value: Any
+    when: Optional[Condition] = None
+
+    def apply(self, premium, inputs):
+        if self.when and not self.when.holds(inputs):
+            return premium, None
+        amount, detail = self.value.evaluate(inputs)
+        if self.kind == "multiply":
+            result = premium * amount
+            text = f"{self.label}: ₹{premium:,.2f} x {amount:g} = ₹{result:,.2f}"
+        else:
+            result = premium + amount
+            text = f"{self.label}: ₹{premium:,.2f} {'+' if amount >= 0 else '-'} ₹{abs(amount):,.2f} = ₹{result:,.2f}"
+        return result, text + (f" ({detail})" if detail else "")
+
+@dataclass(frozen=True)
+class Component:
+    label: str
+    base: Base
+    steps: Tuple[Step, ...] = ()
+    when: Optional[Condition] = None
+
+@dataclass(frozen=True)
+class PolicyPricing:
+    name: str
+    components: Tuple[Component, ...]
+    steps: Tuple[Step, ...] = ()
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    allowed: Dict[str, Tuple[Any, ...]] = field(default_factory=dict)
+    gst: float = DEFAULT_GST
+    period: str = "per year"
+    notes: Tuple[str, ...] = ()
+
+    def quote(self, profile_inputs):
+        inputs = _Inputs(profile_inputs, self.defaults, self.allowed)
+        lines = []
+        try:
+            premium = 0.0
+            for component in self.components:
+                if component.when and not component.when.holds(inputs):
+                    continue
+                amount, text = component.base.evaluate(inputs)
+                lines.append(f"{component.label}: {text}")
+                for step in component.steps:
+                    amount, text = step.apply(amount, inputs)
+                    if text:
+                        lines.append(text)
+                if len(self.components) > 1:
+                    lines.append(f"{component.label} subtotal: ₹{amount:,.2f}")
+                premium += amount
+            for step in self.steps:
+                premium, text = step.apply(premium, inputs)
+                if text:
+                    lines.append(text)
+        except NotQuotable as e:
+            return {
+                "policy": self.name, "quotable": False, "reason": str(e),
+                "inputs": dict(inputs.used), "assumed": sorted(inputs.assumed), "notes": list(self.notes)
+            }
+
+        premium = round(premium, 2)
+        gst = round(premium * self.gst, 2)
+        try:
+            period = self.period.format(**{k: _fmt_key(v) for k, v in inputs.used.items()})
+        except (KeyError, IndexError):
+            period = self.period
+        return {
+            "policy": self.name,
+            "quotable": True,
+            "premium": premium,
+            "gst": gst,
+            "gst_rate": self.gst,
+            "total": round(premium + gst, 2),
+            "period": period,
+            "inputs": dict(inputs.used),
+            "assumed": sorted(inputs.assumed),
+            "steps": lines,
+            "notes": list(self.notes),
+        }
+
+# --- 3. COMPILER (JSON -> typed tables) ---
+def _compile_value(spec, where):
+
+    if _is_number(spec):
+        return Constant(float(spec))
+    if not isinstance(spec, dict):
+        raise PricingError(f"{where}: expected a number or table, got {spec!r}")
+    if "linear" in spec:
+        terms = dict(spec["linear"])
+        const = float(terms.pop("const", 0.0))
+        return Linear(const, tuple((name, float(c)) for name, c in terms.items()))
+    if "bands" in spec:
+        by = spec.get("by")
+        bands = []
+        for row in spec["bands"]:
+            if len(row) != 3:
+                raise PricingError(f"{where}: band rows must be [low, high, value], got {row!r}")
+            low, high, value = row
+            if by:
+                value = _compile_choices(by, value, None, where)
+            elif not _is_number(value):
+                raise PricingError(f"{where}: band value must be a number, got {value!r}")
+            bands.append((float(low), None if high is None else float(high), value))
+        return BandTable(spec["on"], tuple(bands), by)
+    if "values" in spec:
+        return _compile_choices(spec["on"], spec["values"], spec.get("else"), where)
+    raise PricingError(f"{where}: unknown table {spec!r}")
+
+def _compile_choices(on, values, fallback, where):
+
+    if not isinstance(values, dict) or not values:
+        raise PricingError(f"{where}: choice values must be a non-empty object")
+    numeric = all(_as_number(k) is not None and str(k).replace(".", "", 1).isdigit() for k in values)
+    choices = tuple(
+        (float(k) if numeric else str(k).lower(), float(v)) for k, v in values.items()
+    )
+    return ChoiceTable(on, choices, None if fallback is None else float(fallback), numeric)
+
+def _compile_condition(spec, where):
+
+    if spec is None:
+        return None
+    if not isinstance(spec, list) or len(spec) != 3 or spec[1] not in CONDITION_OPS:
+        raise PricingError(f"{where}: 'when' must be [input, op, value] with op in {list(CONDITION_OPS)}")
+    name, op, value = spec
+    return Condition(name, op, float(value) if _is_number(value) else value)
+
+def _compile_steps(specs, where):
+
+    steps = []
+    for i, spec in enumerate(specs or []):
+        kinds = [kind for kind in ("multiply", "add") if kind in spec]
+        if len(kinds) != 1:
+            raise PricingError(f"{where} step {i}: needs exactly one of 'multiply' or 'add'")
+        kind = kinds[0]
+        steps.append(Step(
+            spec.get("label", kind.title()), kind,
+            _compile_value(spec[kind], f"{where} step {i}"),
+            _compile_condition(spec.get("when"), f"{where} step {i}")
+        ))
+    return tuple(steps)
+
+def _compile_base(spec, where):
+
+    if "amount" in spec:
+        return Base(_compile_value(spec["amount"], where))
+    if "rate" in spec:
+        return Base(_compile_value(spec["rate"], where), float(spec.get("per", 1)), spec["of"])
+    raise PricingError(f"{where}: base needs 'amount' or 'rate'")
+
+def compile_policy(name, spec):
+
+    if "components" in spec:
+        components = tuple(
+            Component(
+                c.get("label", f"Section {i + 1}"),
+                _compile_base(c["base"], f"{name} component {i}"),
+                _compile_steps(c.get("steps"), f"{name} component {i}"),
+                _compile_condition(c.get("when"), f"{name} component {i}")
+            )
+            for i, c in enumerate(spec["components"])
+        )
+        steps = _compile_steps(spec.get("steps"), name)
+    elif "base" in spec:
+        components = (Component("Base premium", _compile_base(spec["base"], name), _compile_steps(spec.get("steps"), name)),)
+        steps = ()
+    else:
+        raise PricingError(f"{name}: pricing needs 'base' or 'components'")
+
+    defaults, allowed = {}, {}
+    for input_name, default in spec.get("inputs", {}).items():
+        if isinstance(default, dict):
+            allowed[input_name] = tuple(default.get("allowed", ()))
+            default = default.get("default")
+        defaults[input_name] = default
+
+    return PolicyPricing(
+        name=name,
+        components=components,
+        steps=steps,
+        defaults=defaults,
+        allowed={k: v for k, v in allowed.items() if v},
+        gst=float(spec.get("gst", DEFAULT_GST)),
+        period=spec.get("period", "per year"),
+        notes=tuple(spec.get("notes", ())),
+    )
+
+def compile_pricing(rules):
+
+    compiled = {}
+    for name, rule in rules.items():
+        if "pricing" in rule:
+            compiled[name] = compile_policy(name, rule["pricing"])
+    return compiled
+
+# --- 4. PUBLIC API ---
+def load_rules(path=RULES_FILE):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+_PRICING_TABLES = None
+
+def get_pricing_tables():
+    global _PRICING_TABLES
+    if _PRICING_TABLES is None:
+        _PRICING_TABLES = compile_pricing(load_rules())
+    return _PRICING_TABLES
+
+def get_pricing_for_file(filename):
+
+    tables = get_pricing_tables()
+    if filename in tables:
+        return tables[filename]
+    return tables.get(os.path.basename(filename))
+
+def quote_policy(filename, collected, overrides=None):
+
+    pricing = get_pricing_for_file(filename)
+    if pricing is None:
+        return None
+    inputs = normalize_profile(collected)
+    inputs.update(overrides or {})
+    return pricing.quote(inputs)
+
+def format_quote(quote):
+
+    if not quote["quotable"]:
+        text = f"Policy: {quote['policy']}\nCannot quote: {quote['reason']}"
+    else:
+        used = ", ".join(
+            f"{k}={_fmt_key(v)}" + (" (assumed)" if k in quote["assumed"] else "")
+            for k, v in quote["inputs"].items()
+        )
+        steps = "\n".join(f"  - {line}" for line in quote["steps"])
+        tax = f"GST {quote['gst_rate'] * 100:g}%: +₹{quote['gst']:,.2f}" if quote["gst_rate"] else "GST: exempt"
+        text = (
+            f"Policy: {quote['policy']}\n"
+            f"Inputs Used: {used}\n"
+            f"Calculation:\n{steps}\n"
+            f"  - Premium before tax: ₹{quote['premium']:,.2f}\n"
+            f"  - {tax}\n"
+            f"Final Premium: ₹{quote['total']:,.0f} {quote['period']}"
+        )
+    if quote["notes"]:
+        text += "\nNotes: " + " ".join(quote["notes"])
+    return text
@@ -0,0 +1,163 @@
+# resources.py
+# Process-wide registry: heavy objects are built once and shared by every session/thread.
+import asyncio
+import contextvars
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch" (sentence-transformers on PyTorch) or "onnx" (int8-quantized ONNX Runtime, see onnx_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# What the stored vectors were made with: indexes and learned cases are rebuilt when it changes
+EMBEDDING_ID = EMBEDDING_MODEL if EMBEDDING_BACKEND == "torch" else f"{EMBEDDING_MODEL}@{EMBEDDING_BACKEND}"
+POLICY_FOLDER = "policies"
+# Threads for CPU-bound embedding/vector search when the graph runs under asyncio
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+# Conversation checkpoints: "sqlite" (survives restarts, shareable between workers) or "memory"
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")
+SESSION_DB = os.getenv("SESSION_DB", "sessions.sqlite")
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+_embeddings = None
+_vectorstore = None
+_index_status = "Policy index not opened yet."
+_index_opened = False
+_graph = None
+_executor = None
+_checkpointer = None
+_case_store = None
+
+# --- 1. EMBEDDING MODEL ---
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                log.info(f"🧩 Loading embedding model {EMBEDDING_MODEL} ({EMBEDDING_BACKEND}, once per process)")
+                _embeddings = build_embeddings(EMBEDDING_BACKEND)
+    return _embeddings
+
+def build_embeddings(backend):
+    # Same model and interface either way; ONNX only needs onnxruntime + tokenizers
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    if backend == "onnx":
+        from onnx_embeddings import OnnxMiniLMEmbeddings
+        return OnnxMiniLMEmbeddings(EMBEDDING_MODEL)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected 'torch' or 'onnx')")
+
+# --- 2. VECTOR STORE ---
+def get_vectorstore(folder_path=POLICY_FOLDER):
+    if not _index_opened:
+        with _refresh_lock:
+            if not _index_opened:
+                # Imported here: utils itself depends on get_embeddings() from this module
+                from utils import open_persisted_index
+                vs, msg = open_persisted_index(folder_path)
+                _set_vectorstore(vs, msg)
+    return _vectorstore
+
+def refresh_vectorstore(folder_path=POLICY_FOLDER):
+    # Only one refresh at a time. Readers keep the current handle until the swap: a rebuild writes a
+    # new generation of collections, an incremental refresh only drops a file's old chunks once its
+    # new ones are in (results can mix old and new files while it runs)
+    with _refresh_lock:
+        from utils import load_policies_from_folder
+        vs, msg = load_policies_from_folder(folder_path)
+        if vs:
+            _set_vectorstore(vs, msg)
+        return vs, msg
+
+def _set_vectorstore(vs, status):
+    global _vectorstore, _index_status, _index_opened
+    with _lock:
+        _vectorstore = vs
+        _index_status = status
+        _index_opened = True
+    # A rebuilt index replaces a previous generation nobody can reach any more
+    if vs is not None:
+        vs.drop_retired()
+
+def get_index_status():
+    return _index_status
+
+def chroma_collection(store):
+    # The LangChain wrapper has no upsert / query-with-embeddings / count: the one place that reaches
+    # into its private chromadb collection
+    return store._collection
+
+def get_case_store():
+    # Learned cases live next to the policy index but survive its rebuilds (see cases.py)
+    global _case_store
+    if _case_store is None:
+        with _refresh_lock:
+            if _case_store is None:
+                from cases import CaseStore
+                from utils import PERSIST_DIR
+                _case_store = CaseStore(PERSIST_DIR)
+    return _case_store
+
+# --- 3. COMPILED GRAPH + SESSION STORE ---
+def get_checkpointer():
+    global _checkpointer
+    if _checkpointer is None:
+        with _lock:
+            if _checkpointer is None:
+                if SESSION_STORE == "memory":
+                    from langgraph.checkpoint.memory import InMemorySaver
+                    _checkpointer = InMemorySaver()
+                else:
+                    from langgraph.checkpoint.sqlite import SqliteSaver
+                    _checkpointer = SqliteSaver(sqlite3.connect(SESSION_DB, check_same_thread=False))
+                log.info(f"💾 Session store: {SESSION_STORE}")
+    return _checkpointer
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        checkpointer = get_checkpointer()
+        with _lock:
+            if _graph is None:
+                from workflow import create_graph
+                _graph = create_graph(checkpointer=checkpointer)
+    return _graph
+
+@asynccontextmanager
+async def open_async_graph():
+    # The API server needs an asyncio checkpointer; it owns the connection for its lifetime
+    from workflow import create_graph
+    if SESSION_STORE == "memory":
+        yield create_graph(checkpointer=get_checkpointer())
+        return
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    async with AsyncSqliteSaver.from_conn_string(SESSION_DB) as saver:
+        yield create_graph(checkpointer=saver)
+
+def thread_config(session_id):
+    return {"configurable": {"thread_id": session_id}}
+
+# --- 4. WORKER POOL ---
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    return _executor
+
+async def run_blocking(func, *args, **kwargs):
+    # Bounded: at most SEARCH_WORKERS searches/embeddings at once, the event loop stays free.
+    # The caller's context goes along so spans opened in the worker nest under the current node.
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
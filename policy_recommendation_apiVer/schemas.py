@@ -52,6 +52,14 @@ CATEGORY_MAPPING = {
     ]
 }
 
+# Lookup tables built once from the mapping above
+SUBTYPE_TO_BROAD = {subtype: broad for broad, subtypes in CATEGORY_MAPPING.items() for subtype in subtypes}
+SUBTYPE_SUFFIX_TO_BROAD = {
+    subtype.partition(" - ")[2]: broad
+    for broad, subtypes in CATEGORY_MAPPING.items() for subtype in subtypes if " - " in subtype
+}
+BROAD_BY_NAME = {broad.lower(): broad for broad in CATEGORY_MAPPING}
+
 # --- 2. QUESTION TEMPLATES ---
 # Questions for each BROAD group.
 QUESTION_SCHEMAS = {
@@ -111,7 +119,61 @@ QUESTION_SCHEMAS = {
     "General": ["age", "occupation", "budget", "sum_insured_preference"]
 }
 
-# --- 3. HELPER FUNCTIONS ---
+# --- 3. QUESTION WORDING ---
+# Human-readable question per schema key, rendered locally by collector_node
+FIELD_QUESTIONS = {
+    "age_of_eldest_member": "What is the age of the eldest member to be covered?",
+    "family_members_to_cover": "Who should the policy cover? (e.g. just you, 2 Adults + 1 Child)",
+    "sum_insured_preference": "How much cover (sum insured) would you like? (e.g. 5 Lakhs, 10 Lakhs)",
+    "city_tier": "Which city do you live in? (or Tier 1 / 2 / 3)",
+    "pre_existing_diseases": "Does anyone to be covered have pre-existing conditions (e.g. diabetes, BP)? Say 'None' if not.",
+    "specific_need": "Any specific need, like Maternity, OPD or Critical Illness cover? Say 'None' if not.",
+    "age": "What is your age?",
+    "occupation_risk_class": "What is your occupation? (e.g. office job, field sales, driver)",
+    "occupation": "What is your occupation?",
+    "annual_income": "What is your annual income?",
+    "travel_duration_days": "If this is for a trip, how many days will you travel?",
+    "group_size": "How many people should be covered? (1 if just you)",
+    "vehicle_category": "What type of vehicle is it? (Car, Bike/Scooter, or Commercial vehicle)",
+    "registration_year": "In which year was the vehicle registered?",
+    "engine_cc_or_gvw": "What is the engine capacity in CC (or gross vehicle weight for commercial vehicles)?",
+    "idv_preference": "What is the vehicle's current value (IDV) you want to insure?",
+    "ncb_percentage": "What No Claim Bonus (NCB) % do you have on your current policy? (0% if none)",
+    "policy_tenure_preference": "Would you like a 1-year policy or a long-term (3/5 year) policy?",
+    "animal_species": "What kind of animal is it? (e.g. Dog, Cat)",
+    "animal_breed": "What breed is your pet?",
+    "animal_age": "How old is your pet?",
+    "market_value_or_purchase_price": "What is the animal's market value or purchase price?",
+    "crop_or_animal_type": "Which crop or livestock do you want to insure?",
+    "land_area_or_flock_size": "How much land (acres) or how many animals/birds?",
+    "input_cost_or_sum_insured": "What is the cultivation cost or the sum insured you need?",
+    "location_risk_zone": "Where is the farm located, and is it a flood/drought/high-risk zone?",
+    "property_type": "What type of property is it? (Home, Shop, Office, Factory)",
+    "building_reconstruction_value": "What would it cost to rebuild the building?",
+    "contents_market_value": "What is the value of the contents (furniture, stock, equipment)?",
+    "security_measures": "What security do you have? (e.g. CCTV, guards, alarm, or None)",
+    "financial_product_type": "Which cover do you need? (e.g. Cyber, Credit, Fidelity, Money in Transit)",
+    "annual_turnover": "What is your annual turnover?",
+    "limit_of_liability": "What limit of cover do you need?",
+    "number_of_employees": "How many employees do you have?",
+    "item_description": "What item(s) do you want to insure? (e.g. Jewellery, Laptop)",
+    "invoice_value": "What is the invoice / purchase value?",
+    "item_age": "How old is the item?",
+    "budget": "What is your budget for the premium?",
+}
+
+QUESTION_INTRO = "To find the right {category} insurance policy for you, could you please share:"
+
+def get_field_question(field):
+    # Unknown keys still read naturally: "number_of_floors" -> "Number of floors?"
+    return FIELD_QUESTIONS.get(field) or field.replace("_", " ").capitalize() + "?"
+
+def render_questions(category, fields):
+    lines = [QUESTION_INTRO.format(category=category)]
+    lines += [f"{i}. {get_field_question(field)}" for i, field in enumerate(fields, 1)]
+    return "\n".join(lines)
+
+# --- 4. HELPER FUNCTIONS ---
 
 def get_broad_category_options():
     return list(CATEGORY_MAPPING.keys())
@@ -119,6 +181,19 @@ def get_broad_category_options():
 def get_specific_categories_for_broad(broad_category):
     return CATEGORY_MAPPING.get(broad_category, [])
 
+def get_broad_category_for_label(label):
+    # Document label ("Health - Health Insurance (Premium)") -> broad key used to partition the index
+    if not label:
+        return "General"
+    label = label.strip()
+    prefix, _, subtype = label.partition(" - ")
+    return (
+        SUBTYPE_TO_BROAD.get(label)                          # Listed subtype
+        or SUBTYPE_SUFFIX_TO_BROAD.get(subtype)              # Same subtype under another prefix ("Health - X" vs "Human - X")
+        or BROAD_BY_NAME.get(prefix.strip().lower())         # Prefix names a broad key ("Accident - Personal Accident")
+        or "General"
+    )
+
 def get_required_fields(category_input):
    
     if not category_input:
@@ -127,17 +202,15 @@ def get_required_fields(category_input):
     # Clean input
     clean_input = category_input.strip().lower()
 
-    # STRATEGY 1 & 2: Check against Broad Keys (Direct & Fuzzy)
+    # STRATEGY 1 & 2: O(1) lookups - broad key (any case) or listed subtype (Child -> Parent)
+    broad_key = BROAD_BY_NAME.get(clean_input) or SUBTYPE_TO_BROAD.get(category_input.strip())
+    if broad_key:
+        return QUESTION_SCHEMAS.get(broad_key, QUESTION_SCHEMAS["General"])
+
+    # STRATEGY 3: Fuzzy - input contains a key (e.g. "Health Insurance" contains "health")
     for key in QUESTION_SCHEMAS.keys():
-        key_lower = key.lower()
-        # Exact match (case insensitive) OR Input contains Key (e.g. "Health Insurance" contains "health")
-        if clean_input == key_lower or (key_lower in clean_input):
+        if key.lower() in clean_input:
             return QUESTION_SCHEMAS[key]
-
-    # STRATEGY 3: Reverse lookup (Child -> Parent)
-    for broad_key, specific_list in CATEGORY_MAPPING.items():
-        if category_input in specific_list:
-            return QUESTION_SCHEMAS.get(broad_key, QUESTION_SCHEMAS["General"])
     
     # STRATEGY 4: Fallback
 
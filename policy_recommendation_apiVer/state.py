@@ -1,7 +1,22 @@
-from typing import TypedDict, Any, Optional, List, Dict
+import os
+from typing import TypedDict, Any, Optional, List, Dict, Annotated
+
+# Only the last HISTORY_WINDOW messages are kept in the checkpoint; the profile
+# itself lives in collected_data, so older turns are not needed to route or quote.
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "12"))
+
+def _as_pair(message):
+    if isinstance(message, (tuple, list)):
+        return (message[0], message[1])
+    return (getattr(message, "type", "ai"), getattr(message, "content", str(message)))
+
+def add_windowed(history, new):
+    # Reducer: nodes return only their new message(s); the graph appends and trims
+    merged = [_as_pair(m) for m in (history or [])] + [_as_pair(m) for m in (new or [])]
+    return merged[-HISTORY_WINDOW:]
 
 class AgentState(TypedDict):
-    messages: list              # Chat history
+    messages: Annotated[list, add_windowed]  # Chat history (windowed, checkpointed per thread)
     
     # --- NEW DYNAMIC FIELDS ---
     current_category: Optional[str]  # E.g., "Health", "Vehicle", "Pet", "Agriculture"
@@ -15,6 +30,9 @@ class AgentState(TypedDict):
     policy_context: Optional[str]
 
     logic_context: Optional[str]
+    recommended_policies: Optional[List[str]]  # Sources shown in the last recommendation (re-quoted by sales)
+    shown_policies: Optional[List[str]]  # Every source recommended in this category ("other options" skips them)
+    prefetch_key: Optional[str]  # Background retrieval started by the collector (see prefetch.py)
 
-    vectorstore: Any
+    # The vector store is NOT part of the state: nodes fetch it from the resources registry
     last_asked_field: Optional[str]
\ No newline at end of file
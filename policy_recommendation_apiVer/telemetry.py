@@ -0,0 +1,247 @@
+# telemetry.py
+# Timing spans, counters and histograms for graph nodes, LLM calls, vector searches and ingestion.
+# Exported as Prometheus text (api.py /metrics, or METRICS_PORT for the Streamlit app) and as JSON traces.
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# JSON lines, one per finished span; unset = traces only kept in memory (last TRACE_BUFFER spans)
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "2000"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRIC_PREFIX = "policy_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_traces = deque(maxlen=TRACE_BUFFER)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# --- 1. METRICS ---
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def incr(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        buckets = _histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        buckets[len(LATENCY_BUCKETS)] += 1
+        buckets[-1] += seconds
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render_prometheus():
+    # Text exposition format 0.0.4
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+    for name in sorted({name for (name, _), _ in counters}):
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+        for (metric, labels), value in counters:
+            if metric == name:
+                lines.append(f"{METRIC_PREFIX}{name}{_labels(labels)} {value}")
+    for name in sorted({name for (name, _), _ in histograms}):
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+        for (metric, labels), values in histograms:
+            if metric != name:
+                continue
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(labels, [('le', '+Inf')])} {values[len(LATENCY_BUCKETS)]}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_labels(labels)} {round(values[-1], 6)}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_labels(labels)} {values[len(LATENCY_BUCKETS)]}")
+    return "\n".join(lines) + "\n"
+
+# --- 2. SPANS ---
+@contextmanager
+def span(name, **attrs):
+    # Times the block into span_seconds{span=name}; attrs (and anything set on the yielded
+    # dict, e.g. response sizes) go into the JSON trace of this span
+    parent = _current_span.get()
+    record = {
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "start": time.time(),
+    }
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except GeneratorExit:
+        # A stream the consumer stopped reading
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Generator closed from another context (e.g. garbage collected): nothing to restore
+            pass
+        observe("span_seconds", elapsed, span=name)
+        if status == "error":
+            incr("span_errors_total", span=name)
+        record.update(duration_ms=round(elapsed * 1000, 3), status=status, **attrs)
+        _record_trace(record)
+
+def _record_trace(record):
+
+    with _lock:
+        _traces.append(record)
+        if TRACE_FILE:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+def recent_traces(limit=100):
+    with _lock:
+        return list(_traces)[-limit:]
+
+def traced(name, func=None):
+    # @traced("ingest.load_policies") on a def, or traced("node.router", router_node) for graph nodes;
+    # keeps the call signature, sync or async
+    if func is None:
+        return functools.partial(traced, name)
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+# --- 3. LLM INSTRUMENTATION ---
+def _text_size(content):
+    return len(content) if isinstance(content, str) else len(str(content))
+
+class TracedLLM:
+    # Wraps the (cached) chat model: one span per call with prompt/response sizes and cache hit
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    @staticmethod
+    def _cache_hit(message):
+        # Flag set by CachedLLM on the response of this very call (its hit counter is shared by concurrent calls)
+        return bool((getattr(message, "response_metadata", None) or {}).get("cache_hit"))
+
+    def _finish(self, attrs, method, cached, response_chars):
+        attrs.update(response_chars=response_chars, cached=cached)
+        incr("llm_calls_total", method=method, cached=str(cached).lower())
+        incr("llm_prompt_chars_total", attrs["prompt_chars"])
+        incr("llm_response_chars_total", response_chars)
+
+    def invoke(self, prompt, *args, **kwargs):
+        with span("llm.invoke", prompt_chars=_text_size(prompt)) as attrs:
+            response = self.llm.invoke(prompt, *args, **kwargs)
+            self._finish(attrs, "invoke", self._cache_hit(response), _text_size(response.content))
+            return response
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        with span("llm.invoke", prompt_chars=_text_size(prompt)) as attrs:
+            response = await self.llm.ainvoke(prompt, *args, **kwargs)
+            self._finish(attrs, "ainvoke", self._cache_hit(response), _text_size(response.content))
+            return response
+
+    def stream(self, prompt, *args, **kwargs):
+        with span("llm.stream", prompt_chars=_text_size(prompt)) as attrs:
+            cached, size, first = False, 0, None
+            started = time.perf_counter()
+            for chunk in self.llm.stream(prompt, *args, **kwargs):
+                if first is None:
+                    first = time.perf_counter() - started
+                cached = cached or self._cache_hit(chunk)
+                size += _text_size(chunk.content)
+                yield chunk
+            attrs["first_token_ms"] = round((first or 0.0) * 1000, 3)
+            self._finish(attrs, "stream", cached, size)
+
+    async def astream(self, prompt, *args, **kwargs):
+        with span("llm.stream", prompt_chars=_text_size(prompt)) as attrs:
+            cached, size, first = False, 0, None
+            started = time.perf_counter()
+            async for chunk in self.llm.astream(prompt, *args, **kwargs):
+                if first is None:
+                    first = time.perf_counter() - started
+                cached = cached or self._cache_hit(chunk)
+                size += _text_size(chunk.content)
+                yield chunk
+            attrs["first_token_ms"] = round((first or 0.0) * 1000, 3)
+            self._finish(attrs, "astream", cached, size)
+
+# --- 4. LOCAL EXPORT ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.startswith("/traces"):
+            body, content_type = json.dumps(recent_traces(), default=str).encode("utf-8"), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+
+def start_metrics_server(port=METRICS_PORT):
+    # For processes without their own HTTP API (the Streamlit app); no-op when port is 0
+    global _server
+    if port and _server is None:
+        with _lock:
+            if _server is None:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+                threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+                get_logger(__name__).info(f"📈 Metrics on :{port}/metrics, traces on :{port}/traces")
+    return _server
@@ -0,0 +1,71 @@
+# test_pricing.py
+# The scalar engine (pricing.py) and the bulk engine (bulk_pricing.py) evaluate the same compiled
+# tables: every profile x policy must give the same total, and the same "cannot quote" cells.
+import math
+import os
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Collected answers as the collector stores them (text), one or two per category
+PROFILES = [
+    {"age_of_eldest_member": "34", "family_members_to_cover": "2A+1C", "sum_insured_preference": "5 lakhs", "city_tier": "Tier 2"},
+    {"age_of_eldest_member": "62", "family_members_to_cover": "2 adults", "sum_insured_preference": "10 lakhs", "city_tier": "Tier 1"},
+    {"age": "29", "annual_income": "12 lakhs", "occupation": "software engineer", "sum_insured_preference": "25 lakhs"},
+    {"age": "45", "travel_duration_days": "15 days", "group_size": "4", "occupation": "driver"},
+    {"vehicle_category": "bike", "registration_year": "2021", "engine_cc_or_gvw": "150cc", "idv_preference": "80000",
+     "ncb_percentage": "20%", "policy_tenure_preference": "3 years"},
+    {"vehicle_category": "car", "registration_year": "2016", "engine_cc_or_gvw": "1200cc", "idv_preference": "6 lakhs",
+     "ncb_percentage": "0%", "policy_tenure_preference": "1 year"},
+    {"animal_species": "dog", "animal_breed": "labrador", "animal_age": "3", "market_value_or_purchase_price": "50000"},
+    {"crop_or_animal_type": "wheat", "input_cost_or_sum_insured": "2 lakhs", "land_area_or_flock_size": "5 acres",
+     "location_risk_zone": "flood prone"},
+    {"property_type": "flat", "building_reconstruction_value": "50 lakhs", "contents_market_value": "10 lakhs",
+     "security_measures": "cctv", "annual_turnover": "2 crores"},
+    {},
+]
+
+@pytest.fixture(scope="module")
+def engines(request):
+    # Rate tables are read from the working directory
+    cwd = os.getcwd()
+    os.chdir(HERE)
+    request.addfinalizer(lambda: os.chdir(cwd))
+    import pricing
+    import bulk_pricing
+    pricing._PRICING_TABLES = None
+    return pricing, bulk_pricing
+
+def _profiles(tables):
+    # Every allowed option is also sent as text, the way overrides and answers arrive
+    profiles = list(PROFILES)
+    for pricing in tables.values():
+        for name, options in pricing.allowed.items():
+            profiles.extend({**PROFILES[0], name: str(option)} for option in options)
+    return profiles
+
+def test_scalar_and_bulk_quotes_agree(engines):
+    pricing, bulk_pricing = engines
+    tables = pricing.get_pricing_tables()
+    assert tables, "policy_rules.json has no pricing blocks"
+    profiles = _profiles(tables)
+    matrix = bulk_pricing.quote_matrix(profiles)
+
+    mismatches = []
+    for i, profile in enumerate(profiles):
+        for j, name in enumerate(matrix.policies):
+            quote = pricing.quote_policy(name, profile)
+            bulk = matrix.totals[i, j]
+            if not quote["quotable"]:
+                if not math.isnan(bulk):
+                    mismatches.append((name, profile, quote["reason"], bulk))
+            elif math.isnan(bulk) or abs(quote["total"] - bulk) > 0.01:
+                mismatches.append((name, profile, quote["total"], bulk))
+    assert not mismatches, mismatches[:5]
+
+def test_numeric_option_given_as_text_is_offered(engines):
+    pricing, _ = engines
+    quote = pricing.quote_policy("Hospital_Cash_Insurance_Policy.pdf", {}, {"coverage_days": "60"})
+    assert quote["quotable"], quote.get("reason")
+    assert quote["inputs"]["coverage_days"] == 60
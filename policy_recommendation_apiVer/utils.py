@@ -1,12 +1,54 @@
 import os
 import glob
+import hashlib
+import json
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters.character import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from resources import EMBEDDING_ID, chroma_collection, get_embeddings, get_case_store
+from prefetch import analyst_query
+from lexical import LexicalIndex, reciprocal_rank_fusion
+from digests import DigestStore, build_digest
+from pricing import get_pricing_for_file
+from telemetry import get_logger, span, traced, incr
+from schemas import get_broad_category_options, get_broad_category_for_label
 
-CATEGORY_REGEX = r"(?:Category|Type|Class)\s*[:\-]\s*([a-zA-Z\s]+)"
+log = get_logger(__name__)
+
+# Whole label up to the end of the line: "Human - Health Insurance (Top-Up)", not just "Human"
+CATEGORY_REGEX = r"(?:Category|Type|Class)[ \t]*[:\-][ \t]*([^\r\n]+)"
+
+# --- INDEX SETTINGS ---
+# Bump INDEX_VERSION whenever chunking/metadata logic changes so old vectors get rebuilt
+PERSIST_DIR = "./chroma_db"
+MANIFEST_FILE = "index_manifest.json"
+INDEX_VERSION = 5
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# --- INGESTION PIPELINE ---
+# INGEST_WORKERS=1 parses in-process (no pool); 0/unset lets the pool use every core
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or None
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# --- POLICY-LEVEL RETRIEVAL ---
+# RETRIEVAL_MMR=1 diversifies the top policies (maximal marginal relevance) instead of pure similarity
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "0") in ("1", "true", "True")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+MMR_FETCH_FACTOR = 4
+# HYBRID_RETRIEVAL=1 fuses the vector ranking with BM25 over policy text (reciprocal rank fusion)
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") in ("1", "true", "True")
+RRF_K = int(os.getenv("RRF_K", "60"))
+# In-process LRU caches: query text -> embedding (shared), search -> policies (per index handle)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
 
 def extract_category_from_text(text):
 
@@ -16,80 +58,659 @@ def extract_category_from_text(text):
         return match.group(1).strip()
     return "General" # Fallback if field not found
 
-def load_policies_from_folder(folder_path="policies"):
+# --- QUERY CACHES ---
+class LRUCache:
+    # Small thread-safe LRU with the same counters as the LLM cache
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+def normalize_query(query):
+    # "Health insurance ... 5 Lakhs,  Tier 2" and "health insurance ... 5 lakhs tier 2" embed the same
+    return " ".join(re.sub(r"[^\w.+]+", " ", str(query).lower()).split())
+
+_query_embeddings = LRUCache(QUERY_CACHE_SIZE)
+
+# --- PARTITIONED VECTOR STORE ---
+# One Chroma collection per broad category: a Health query only scans Health vectors,
+# so search cost follows the size of one category, not of the whole catalogue.
+COLLECTION_PREFIX = "policies_"
+POLICY_SUFFIX = "__policy"       # Per-policy aggregate collection next to each chunk collection
+LEGACY_COLLECTION = "langchain"  # Single shared collection used by INDEX_VERSION 1
+
+def collection_name_for(broad_category, generation=0):
+    name = COLLECTION_PREFIX + re.sub(r"[^a-z0-9]+", "_", broad_category.lower()).strip("_")
+    # A rebuild writes a new generation next to the live collections (see load_policies_from_folder)
+    return f"{name}_g{generation}" if generation else name
+
+def make_policy_id(file_name):
+    return hashlib.sha1(f"policy:{file_name}".encode("utf-8")).hexdigest()
+
+class PartitionedVectorStore:
+    # Routes writes by the chunk's "broad_category" metadata and reads by the category asked for.
+    # Each partition also has a policy-level collection: one vector per file (mean of its chunks).
+
+    def __init__(self, persist_dir=PERSIST_DIR, embeddings=None, generation=None):
+        self.persist_dir = persist_dir
+        self.embeddings = embeddings or get_embeddings()
+        self.generation = (load_manifest(persist_dir) or {}).get("generation", 0) if generation is None else generation
+        categories = get_broad_category_options() + ["General"]
+        self.partitions = {category: self._open(collection_name_for(category, self.generation)) for category in categories}
+        self.policies = {
+            category: self._open(collection_name_for(category, self.generation) + POLICY_SUFFIX) for category in categories
+        }
+        # Handle of the generation this one replaced, dropped once nothing searches it (drop_retired)
+        self.retired = None
+        # Results depend on what is indexed: cached per handle and dropped on every write
+        self.results = LRUCache(RESULT_CACHE_SIZE)
+        self.lexical = LexicalIndex.load(persist_dir)
+        self.digests = DigestStore.load(persist_dir)
+
+    def _open(self, name):
+        return Chroma(collection_name=name, persist_directory=self.persist_dir, embedding_function=self.embeddings)
+
+    def partition(self, category):
+        return self.partitions[category if category in self.partitions else "General"]
+
+    def embed_query(self, query):
+        key = (INDEX_VERSION, EMBEDDING_ID, normalize_query(query))
+        embedding = _query_embeddings.get(key)
+        incr("retrieval_cache_total", cache="embedding", result="miss" if embedding is None else "hit")
+        if embedding is None:
+            with span("retrieval.embed_query", query_chars=len(query)):
+                embedding = self.embeddings.embed_query(query)
+            _query_embeddings.put(key, embedding)
+        return embedding
+
+    def cache_stats(self):
+        return {"embeddings": _query_embeddings.stats(), "results": self.results.stats()}
+
+    def add_texts(self, texts, metadatas, ids):
+        self.results.clear()
+        grouped = {}
+        for text, metadata, chunk_id in zip(texts, metadatas, ids):
+            group = grouped.setdefault(metadata.get("broad_category", "General"), ([], [], []))
+            group[0].append(text)
+            group[1].append(metadata)
+            group[2].append(chunk_id)
+        for category, (part_texts, part_metadatas, part_ids) in grouped.items():
+            self.partition(category).add_texts(part_texts, metadatas=part_metadatas, ids=part_ids)
+
+    def delete(self, ids, category=None):
+        if not ids:
+            return
+        self.results.clear()
+        targets = [self.partition(category)] if category else self.partitions.values()
+        for store in targets:
+            store.delete(ids=ids)
+
+    def add_policies(self, files):
+        # files: [(file_name, broad_category, chunk_ids)] already written to the chunk collections.
+        # Vectors are read back, not re-embedded: the policy vector is the normalized mean of its chunks.
+        self.results.clear()
+        for file_name, category, chunk_ids in files:
+            found = chroma_collection(self.partition(category)).get(ids=chunk_ids, include=["embeddings", "documents", "metadatas"])
+            if not len(found["ids"]):
+                continue
+            order = {cid: i for i, cid in enumerate(found["ids"])}
+            lead = order[chunk_ids[0]] if chunk_ids[0] in order else 0
+            vectors = np.asarray(found["embeddings"], dtype=float)
+            mean = vectors.mean(axis=0)
+            mean = mean / (np.linalg.norm(mean) or 1.0)
+            # The document is the opening chunk: the overview/eligibility the analyst quotes from
+            chroma_collection(self.policy_partition(category)).upsert(
+                ids=[make_policy_id(file_name)], embeddings=[mean.tolist()],
+                documents=[found["documents"][lead]], metadatas=[found["metadatas"][lead]]
+            )
+
+    def delete_policy(self, file_name, category=None):
+        self.results.clear()
+        self.lexical.remove(file_name)
+        self.digests.remove(file_name)
+        targets = [self.policy_partition(category)] if category else self.policies.values()
+        for store in targets:
+            store.delete(ids=[make_policy_id(file_name)])
+
+    def policy_partition(self, category):
+        return self.policies[category if category in self.policies else "General"]
+
+    def search_policies(self, query, n=3, category=None, mmr=RETRIEVAL_MMR, lambda_mult=MMR_LAMBDA, exclude=()):
+        # Top-n DISTINCT policies in one query against the aggregate index (no chunk over-fetch + dedupe);
+        # exclude: sources already shown ("other options"), part of the cache key
+        exclude = tuple(sorted(set(exclude)))
+        with span("retrieval.search_policies", category=category, n=n, mmr=mmr, hybrid=HYBRID_RETRIEVAL) as attrs:
+            key = (INDEX_VERSION, normalize_query(query), category, n, mmr, lambda_mult, HYBRID_RETRIEVAL, exclude)
+            cached = self.results.get(key)
+            attrs["cached"] = cached is not None
+            incr("retrieval_cache_total", cache="results", result="hit" if cached is not None else "miss")
+            if cached is not None:
+                return list(cached)
+            docs = self._search_policies(query, n + len(exclude), category, mmr, lambda_mult)
+            docs = [doc for doc in docs if doc.metadata.get("source") not in exclude][:n]
+            attrs["results"] = len(docs)
+            self.results.put(key, docs)
+            return list(docs)
+
+    def _search_policies(self, query, n, category, mmr, lambda_mult):
+
+        fetch = n * MMR_FETCH_FACTOR if mmr or HYBRID_RETRIEVAL else n
+        candidates, ranking, lexical_hits = self._policy_candidates(query, fetch, category)
+        return self._rank_candidates(query, candidates, ranking, lexical_hits, n, category, mmr, lambda_mult)
+
+    def policy_candidates(self, query, n, category=None):
+        # Retrieval without the final ranking: source -> (distance, document, metadata, embedding)
+        # for up to n vector hits plus the lexical hits; rank_candidates() orders them for any later query
+        with span("retrieval.policy_candidates", category=category, n=n) as attrs:
+            candidates, _, _ = self._policy_candidates(query, n, category)
+            attrs["results"] = len(candidates)
+            return candidates
+
+    def rank_candidates(self, query, candidates, n=3, category=None, mmr=RETRIEVAL_MMR, lambda_mult=MMR_LAMBDA):
+        # Same ranking as search_policies, over a candidate set fetched earlier (no vector store query)
+        with span("retrieval.rank_candidates", candidates=len(candidates), n=n):
+            embedding = np.asarray(self.embed_query(query), dtype=float)
+            distances = {
+                source: float(np.sum((np.asarray(candidate[3], dtype=float) - embedding) ** 2))
+                for source, candidate in candidates.items()
+            }
+            ranking = sorted(distances, key=distances.get)
+            return self._rank_candidates(query, candidates, ranking, None, n, category, mmr, lambda_mult)
+
+    def _policy_candidates(self, query, fetch, category):
+
+        stores = [self.policies[category]] if category in self.policies else list(self.policies.values())
+        embedding = self.embed_query(query)
+
+        # source -> (distance, document, metadata, embedding)
+        candidates = {}
+        for store in stores:
+            available = chroma_collection(store).count()
+            if not available:
+                continue
+            found = chroma_collection(store).query(
+                query_embeddings=[embedding], n_results=min(fetch, available),
+                include=["documents", "metadatas", "distances", "embeddings"]
+            )
+            for candidate in zip(found["distances"][0], found["documents"][0], found["metadatas"][0], found["embeddings"][0]):
+                candidates[candidate[2].get("source", "Unknown")] = candidate
+        ranking = sorted(candidates, key=lambda source: candidates[source][0])
+
+        lexical_hits = None
+        if HYBRID_RETRIEVAL:
+            lexical_hits = self._lexical_hits(query, fetch, category)
+            self._fetch_policies([f for f in lexical_hits if f not in candidates], candidates)
+        return candidates, ranking, lexical_hits
+
+    def _lexical_hits(self, query, n, category):
+        return [file_name for file_name, _ in self.lexical.search(query, n, category if category in self.policies else None)]
+
+    def _rank_candidates(self, query, candidates, ranking, lexical_hits, n, category, mmr, lambda_mult):
+        # ranking: candidate sources by vector distance, best first
+        if HYBRID_RETRIEVAL:
+            if lexical_hits is None:
+                lexical_hits = self._lexical_hits(query, n * MMR_FETCH_FACTOR, category)
+            ranking = [source for source in reciprocal_rank_fusion([ranking, lexical_hits], RRF_K) if source in candidates]
+
+        if mmr and len(ranking) > n:
+            embedding = self.embed_query(query)
+            picked = maximal_marginal_relevance(np.asarray(embedding), [candidates[s][3] for s in ranking], lambda_mult=lambda_mult, k=n)
+            ranking = [ranking[i] for i in picked]
+        return [Document(page_content=candidates[s][1], metadata=candidates[s][2]) for s in ranking[:n]]
+
+    def fetch_policies(self, file_names):
+        # Named policies (opening chunk, like search_policies returns), in the given order; unknown names skipped
+        candidates = {}
+        self._fetch_policies([f for f in file_names if f in self.lexical.docs], candidates)
+        return [Document(page_content=candidates[f][1], metadata=candidates[f][2]) for f in file_names if f in candidates]
+
+    def _fetch_policies(self, file_names, candidates):
+        # Lexical-only hits: pull their policy vector + opening chunk from the aggregate collection
+        for file_name in file_names:
+            store = self.policy_partition(self.lexical.docs[file_name]["category"])
+            found = chroma_collection(store).get(ids=[make_policy_id(file_name)], include=["documents", "metadatas", "embeddings"])
+            if len(found["ids"]):
+                candidates[file_name] = (None, found["documents"][0], found["metadatas"][0], found["embeddings"][0])
+
+    def best_chunks(self, query, sources, per_source=3):
+        # -> {source: [Document, ...]} the chunks of the named policies closest to the query, best first;
+        # one query per partition the sources live in
+        with span("retrieval.best_chunks", sources=len(sources), per_source=per_source):
+            embedding = self.embed_query(query)
+            by_category = {}
+            for source in sources:
+                doc = self.lexical.docs.get(source)
+                by_category.setdefault(doc["category"] if doc else None, []).append(source)
+
+            scored = {source: [] for source in sources}
+            for category, names in by_category.items():
+                stores = [self.partitions[category]] if category in self.partitions else list(self.partitions.values())
+                for store in stores:
+                    available = chroma_collection(store).count()
+                    if not available:
+                        continue
+                    found = chroma_collection(store).query(
+                        query_embeddings=[embedding], n_results=min(per_source * len(names), available),
+                        where={"source": {"$in": names}}, include=["documents", "metadatas", "distances"]
+                    )
+                    for doc, metadata, distance in zip(found["documents"][0], found["metadatas"][0], found["distances"][0]):
+                        scored[metadata["source"]].append((distance, Document(page_content=doc, metadata=metadata)))
+            return {source: [doc for _, doc in sorted(hits, key=lambda h: h[0])[:per_source]] for source, hits in scored.items()}
+
+    @traced("retrieval.similarity_search")
+    def similarity_search(self, query, k=4, category=None, filter=None):
+        # Known category -> that collection only; otherwise every partition, merged by distance
+        if category in self.partitions:
+            return self.partitions[category].similarity_search_by_vector(self.embed_query(query), k=k, filter=filter)
+        embedding = self.embed_query(query)
+        scored = []
+        for store in self.partitions.values():
+            if chroma_collection(store).count():
+                scored += store.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+        scored.sort(key=lambda pair: pair[1])
+        return [doc for doc, _ in scored[:k]]
+
+    def count(self):
+        return sum(chroma_collection(store).count() for store in self.partitions.values())
+
+    def policy_count(self):
+        return sum(chroma_collection(store).count() for store in self.policies.values())
+
+    def counts(self):
+        return {category: chroma_collection(store).count() for category, store in self.partitions.items()}
+
+    def drop_retired(self):
+        # Called after the swap to this handle: the previous generation's collections can go
+        retired, self.retired = self.retired, None
+        if retired is not None:
+            retired.delete_collection()
+            log.info(f"🗑️ Dropped index generation {retired.generation}")
+
+    def delete_collection(self):
+        for store in list(self.partitions.values()) + list(self.policies.values()):
+            store.delete_collection()
+        # Vectors from before partitioning are never read again
+        Chroma(collection_name=LEGACY_COLLECTION, persist_directory=self.persist_dir,
+               embedding_function=self.embeddings).delete_collection()
+        self.lexical = LexicalIndex()
+        self.digests = DigestStore()
+
+def file_sha256(file_path):
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_chunk_id(file_name, file_hash, index):
+    # Same file content -> same IDs, so re-adding a chunk is an upsert, never a duplicate
+    return hashlib.sha1(f"{file_name}:{file_hash}:{index}".encode("utf-8")).hexdigest()
+
+def new_manifest():
+    return {
+        "version": INDEX_VERSION,
+        "embedding_model": EMBEDDING_ID,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "files": {}
+    }
+
+def manifest_is_compatible(manifest):
+    # Any change to how chunks are produced or embedded invalidates every stored vector
+    if not manifest:
+        return False
+    reference = new_manifest()
+    return all(manifest.get(key) == reference[key] for key in ("version", "embedding_model", "chunk_size", "chunk_overlap"))
+
+def load_manifest(persist_dir=PERSIST_DIR):
+
+    manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"⚠️ Ignoring unreadable index manifest {manifest_path}: {e}")
+        return None
+
+def save_manifest(manifest, persist_dir=PERSIST_DIR):
+
+    os.makedirs(persist_dir, exist_ok=True)
+    manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def list_policy_files(folder_path="policies"):
 
-    # 1. Get all file paths
     pdf_files = glob.glob(os.path.join(folder_path, "*.pdf"))
     txt_files = glob.glob(os.path.join(folder_path, "*.txt"))
-    all_files = pdf_files + txt_files
-    
+    return sorted(pdf_files + txt_files)
+
+def parse_policy_file(file_path):
+    # Runs inside the ingestion process pool: returns plain (picklable) texts + metadata + digest
+
+    if file_path.endswith(".pdf"):
+        loader = PyPDFLoader(file_path)
+    else:
+        loader = TextLoader(file_path)
+
+    data = loader.load()
+    if not data:
+        return None, [], [], None
+
+    first_page_text = data[0].page_content
+    detected_category = extract_category_from_text(first_page_text)
+
+    file_name = os.path.basename(file_path)
+    broad_category = get_broad_category_for_label(detected_category)
+    for doc in data:
+        doc.metadata["source"] = file_name
+        # This enables the strict filtering in your Agent
+        doc.metadata["category"] = detected_category
+        # ...and this picks the partition the chunks are written to
+        doc.metadata["broad_category"] = broad_category
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = text_splitter.split_documents(data)
+    # Whole document, not chunks: sections straddle chunk (and page) boundaries
+    digest = build_digest(file_name, detected_category, "\n".join(doc.page_content for doc in data), broad_category)
+    return detected_category, [c.page_content for c in chunks], [c.metadata for c in chunks], digest
+
+def iter_parsed_files(file_paths, workers=INGEST_WORKERS):
+    # Yields (file_path, result, error) as soon as each file is parsed, in completion order
+
+    if workers == 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            try:
+                yield file_path, parse_policy_file(file_path), None
+            except Exception as e:
+                yield file_path, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(parse_policy_file, path): path for path in file_paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                yield file_path, future.result(), None
+            except Exception as e:
+                yield file_path, None, e
+
+@traced("ingest.load_policies")
+def load_policies_from_folder(folder_path="policies", persist_dir=PERSIST_DIR, rebuild=False,
+                              workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE):
+
+    # 1. Get all file paths
+    all_files = list_policy_files(folder_path)
+
     if not all_files:
         return None, f"No PDF or TXT files found in '{folder_path}' folder."
 
-    all_chunks = []
-    
-    # 2. Load each file
-    print(f"Loading {len(all_files)} files from {folder_path}...")
-    for file_path in all_files:
+    embeddings = get_embeddings()
+
+    # 2. Reconcile with the manifest of what is already embedded
+    manifest = load_manifest(persist_dir)
+    generation = (manifest or {}).get("generation", 0)
+    vectorstore = PartitionedVectorStore(persist_dir, embeddings, generation)
+    if rebuild or not manifest_is_compatible(manifest):
+        # No usable manifest: chunk IDs in the store are unknown, so start from clean collections.
+        # They are a new generation: the live handle keeps searching the old one until the caller
+        # swaps handles and calls drop_retired()
+        log.info(f"♻️ Rebuilding the collections in {persist_dir} from scratch (generation {generation + 1})")
+        fresh = PartitionedVectorStore(persist_dir, embeddings, generation + 1)
+        # Leftovers of an interrupted rebuild
+        fresh.delete_collection()
+        fresh = PartitionedVectorStore(persist_dir, embeddings, generation + 1)
+        fresh.lexical, fresh.digests = LexicalIndex(), DigestStore()
+        fresh.retired = vectorstore
+        vectorstore = fresh
+        manifest = new_manifest()
+        manifest["generation"] = generation + 1
+
+    indexed = manifest["files"]
+    current_files = {os.path.basename(path): path for path in all_files}
+    added, updated, removed, unchanged, failed = 0, 0, 0, 0, 0
+
+    for file_name in sorted(set(indexed) - set(current_files)):
+        stale_ids = indexed[file_name].get("chunk_ids", [])
+        vectorstore.delete(stale_ids, indexed[file_name].get("broad_category"))
+        vectorstore.delete_policy(file_name, indexed[file_name].get("broad_category"))
+        del indexed[file_name]
+        removed += 1
+        log.info(f"   🗑️ Removed: {file_name}")
+
+    log.info(f"Checking {len(all_files)} files from {folder_path}...")
+    pending = {}
+    with span("ingest.scan", files=len(current_files)) as attrs:
+        for file_name, file_path in current_files.items():
+            try:
+                stat = os.stat(file_path)
+                entry = indexed.get(file_name)
+
+                # Cheap check first: size + mtime unchanged means we do not even hash the file
+                if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+                    unchanged += 1
+                    continue
+
+                file_hash = file_sha256(file_path)
+                if entry and entry.get("hash") == file_hash:
+                    entry["mtime"] = stat.st_mtime
+                    entry["size"] = stat.st_size
+                    unchanged += 1
+                    continue
+
+                pending[file_path] = (file_name, file_hash, stat)
+            except OSError as e:
+                failed += 1
+                log.error(f"Error loading {file_path}: {e}")
+        attrs["pending"] = len(pending)
+
+    # 3. New or changed content -> parse in the pool, embed + write in batches as results stream in.
+    # A file is committed (old chunks dropped, lexical/digest/manifest updated) only once every one of its
+    # new chunks is written; new chunk IDs carry the new hash, so until then the old version stays searchable.
+    batch_texts, batch_metadatas, batch_ids, batch_files = [], [], [], []
+    in_flight = {}
+    touched = []
+
+    def commit_file(file_name):
+        nonlocal added, updated
+        job = in_flight.pop(file_name)
+        entry, broad_category, chunk_ids = job["entry"], job["broad_category"], job["chunk_ids"]
+        if entry:
+            # A relabelled file moves partition: drop all of its old chunks from the old one
+            fresh_ids = set(chunk_ids) if entry.get("broad_category") == broad_category else set()
+            stale_ids = [cid for cid in entry.get("chunk_ids", []) if cid not in fresh_ids]
+            vectorstore.delete(stale_ids, entry.get("broad_category"))
+            if entry.get("broad_category") != broad_category:
+                vectorstore.delete_policy(file_name, entry.get("broad_category"))
+        touched.append((file_name, broad_category, chunk_ids))
+        vectorstore.lexical.add(file_name, broad_category, job["texts"])
+        vectorstore.digests.add(job["digest"])
+        indexed[file_name] = job["manifest_entry"]
+        if entry:
+            updated += 1
+        else:
+            added += 1
+
+    def fail_file(file_name, error):
+        # Undo the part of the new version already written and unqueue the rest; the previous
+        # entry and its vectors were never touched
+        nonlocal failed
+        job = in_flight.pop(file_name)
+        old_ids = set(job["entry"].get("chunk_ids", [])) if job["entry"] else set()
         try:
-            if file_path.endswith(".pdf"):
-                loader = PyPDFLoader(file_path)
-            else:
-                loader = TextLoader(file_path)
-                
-            data = loader.load()
-
-            if not data: continue
-
-            first_page_text = data[0].page_content
-            detected_category = extract_category_from_text(first_page_text)
-            
-            file_name = os.path.basename(file_path)
-            print(f"   📄 File: {file_name} -> Detected Category: [{detected_category}]")
-
-            for doc in data:
-                doc.metadata["source"] = file_name
-                # This enables the strict filtering in your Agent
-                doc.metadata["category"] = detected_category
-                
-            # Split text
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-            chunks = text_splitter.split_documents(data)
-            all_chunks.extend(chunks)
+            vectorstore.delete([cid for cid in job["chunk_ids"] if cid not in old_ids], job["broad_category"])
         except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-
-    # 3. Create Vector Store (THE FIX: Added persist_directory)
-    if all_chunks:
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        
-        # This directory is where the database will be saved on your computer
-        persist_dir = "./chroma_db"
-        
-        vectorstore = Chroma.from_documents(
-            documents=all_chunks, 
-            embedding=embeddings, 
-            persist_directory=persist_dir  # <--- THIS FIXES THE ERROR
-        )
-        return vectorstore, f"Successfully loaded {len(all_files)} documents."
-    
-    return None, "Failed to process documents."
-
-def save_learned_case(profile, chosen_policy_name, reason, folder="policies"):
-    
-    file_path = os.path.join(folder, "learned_data.txt")
-    
-    entry = f"""
-    [LEARNED CASE STUDY]
-    Scenario: User is {profile.get('age')} years old, works as {profile.get('occupation')}, budget {profile.get('budget')}.
-    Concern: {profile.get('concerns')}
-    Successful Recommendation: {chosen_policy_name}
-    Why it worked: {reason}
-    ---------------------------------------------------
-    """
-    
-    with open(file_path, "a") as f:
-        f.write(entry)
-        
-
-    print(f"✅ Learned new case: {chosen_policy_name}")
+            log.warning(f"⚠️ Could not clean up partial chunks of {file_name}: {e}")
+        keep = [i for i, name in enumerate(batch_files) if name != file_name]
+        for column in (batch_texts, batch_metadatas, batch_ids, batch_files):
+            column[:] = [column[i] for i in keep]
+        failed += 1
+        log.error(f"Error indexing {file_name}: {error}")
+
+    def flush_batches(final=False):
+        # One embedding call and one bulk upsert per full batch; the tail goes out at the end
+        while len(batch_ids) >= batch_size or (final and batch_ids):
+            ids, files = batch_ids[:batch_size], batch_files[:batch_size]
+            try:
+                with span("ingest.embed_batch", chunks=len(ids)):
+                    vectorstore.add_texts(batch_texts[:batch_size], metadatas=batch_metadatas[:batch_size], ids=ids)
+            except Exception as e:
+                # Only the files with chunks in this batch fail (their queued chunks go with them)
+                for file_name in dict.fromkeys(files):
+                    fail_file(file_name, e)
+                continue
+            incr("ingest_chunks_total", len(ids))
+            del batch_texts[:batch_size], batch_metadatas[:batch_size], batch_ids[:batch_size], batch_files[:batch_size]
+            for chunk_id, file_name in zip(ids, files):
+                in_flight[file_name]["left"].discard(chunk_id)
+            for file_name in dict.fromkeys(files):
+                if not in_flight[file_name]["left"]:
+                    commit_file(file_name)
+
+    if pending:
+        log.info(f"Indexing {len(pending)} new/changed files (workers={workers or 'auto'}, batch={batch_size})...")
+    for file_path, result, error in iter_parsed_files(list(pending), workers):
+        file_name, file_hash, stat = pending[file_path]
+        if error is not None:
+            # Parsing failed before anything was written: the previous entry and its vectors stay
+            failed += 1
+            log.error(f"Error loading {file_path}: {error}")
+            continue
+
+        detected_category, texts, metadatas, digest = result
+        if not texts:
+            # Nothing indexable left in a changed file: drop it like a removed one, stale text must not stay searchable
+            entry = indexed.pop(file_name, None)
+            if entry:
+                vectorstore.delete(entry.get("chunk_ids", []), entry.get("broad_category"))
+                vectorstore.delete_policy(file_name, entry.get("broad_category"))
+                removed += 1
+                log.info(f"   🗑️ Removed (no text left): {file_name}")
+            continue
+        log.info(f"   📄 File: {file_name} -> Detected Category: [{detected_category}]")
+
+        chunk_ids = [make_chunk_id(file_name, file_hash, i) for i in range(len(texts))]
+        broad_category = metadatas[0]["broad_category"]
+        digest["pricing_key"] = file_name if get_pricing_for_file(file_name) else None
+        in_flight[file_name] = {
+            "entry": indexed.get(file_name),
+            "broad_category": broad_category,
+            "chunk_ids": chunk_ids,
+            "left": set(chunk_ids),
+            "texts": texts,
+            "digest": digest,
+            "manifest_entry": {
+                "hash": file_hash,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "category": detected_category,
+                "broad_category": broad_category,
+                "chunk_ids": chunk_ids
+            },
+        }
+        batch_texts.extend(texts)
+        batch_metadatas.extend(metadatas)
+        batch_ids.extend(chunk_ids)
+        batch_files.extend([file_name] * len(chunk_ids))
+        flush_batches()
+    flush_batches(final=True)
+    # Policy-level vectors once every chunk of the touched files is written
+    with span("ingest.policy_vectors", files=len(touched)):
+        vectorstore.add_policies(touched)
+
+    with span("ingest.save"):
+        vectorstore.lexical.save(persist_dir)
+        vectorstore.digests.save(persist_dir)
+        save_manifest(manifest, persist_dir)
+    for result, count in (("added", added), ("updated", updated), ("removed", removed), ("unchanged", unchanged), ("failed", failed)):
+        incr("ingest_files_total", count, result=result)
+
+    if not indexed:
+        return None, "Failed to process documents."
+
+    summary = f"{added} added, {updated} updated, {removed} removed, {unchanged} unchanged"
+    if failed:
+        summary += f", {failed} failed"
+    return vectorstore, f"Successfully loaded {len(indexed)} documents ({summary})."
+
+def index_is_current(manifest, folder_path="policies"):
+
+    # Startup validation: compare file names, sizes and mtimes only (no hashing, no parsing)
+    current_files = {os.path.basename(path): path for path in list_policy_files(folder_path)}
+    indexed = manifest.get("files", {})
+    if set(current_files) != set(indexed):
+        return False
+    for file_name, file_path in current_files.items():
+        stat = os.stat(file_path)
+        entry = indexed[file_name]
+        if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime:
+            return False
+    return True
+
+@traced("ingest.open_index")
+def open_persisted_index(folder_path="policies", persist_dir=PERSIST_DIR):
+
+    manifest = load_manifest(persist_dir)
+    if not manifest_is_compatible(manifest):
+        log.warning(f"⚠️ No compatible index in {persist_dir}, building it now...")
+        return load_policies_from_folder(folder_path, persist_dir)
+
+    if not index_is_current(manifest, folder_path):
+        log.warning(f"⚠️ Index in {persist_dir} is out of date with '{folder_path}', refreshing changed files...")
+        return load_policies_from_folder(folder_path, persist_dir)
+
+    vectorstore = PartitionedVectorStore(persist_dir)
+
+    expected_chunks = sum(len(entry.get("chunk_ids", [])) for entry in manifest["files"].values())
+    if (vectorstore.count() != expected_chunks or vectorstore.policy_count() != len(manifest["files"])
+            or set(vectorstore.lexical.docs) != set(manifest["files"])
+            or set(vectorstore.digests.digests) != set(manifest["files"])):
+        log.warning(f"⚠️ Index in {persist_dir} does not match its manifest, re-indexing...")
+        return load_policies_from_folder(folder_path, persist_dir, rebuild=True)
+
+    log.info(f"✅ Attached to persisted index: {len(manifest['files'])} documents, {expected_chunks} chunks")
+    return vectorstore, f"Loaded persisted index ({len(manifest['files'])} documents)."
+
+def save_learned_case(profile, chosen_policy_name, reason, category=None):
+    # Structured, embedded on write and searchable at once (no re-index); see cases.CaseStore
+    category = category or "General"
+    case = get_case_store().add(analyst_query(category, profile), category, profile, chosen_policy_name, reason)
+    log.info(f"✅ Learned new case: {chosen_policy_name}")
+    return case
@@ -1,6 +1,11 @@
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
 from state import AgentState
-from agents import router_node, collector_node, analyst_node, sales_node
+from telemetry import traced
+from agents import (
+    router_node, collector_node, analyst_node, sales_node,
+    arouter_node, acollector_node, aanalyst_node, asales_node
+)
 
 
 
@@ -12,14 +17,18 @@ def decide_next_node(state: AgentState):
     return state["next_step"]
 
 # --- 3. GRAPH CONSTRUCTION ---
-def create_graph():
+def create_graph(checkpointer=None):
     workflow = StateGraph(AgentState)
 
-    # Add Nodes
-    workflow.add_node("router", router_node)
-    workflow.add_node("collector", collector_node)
-    workflow.add_node("analyst", analyst_node)
-    workflow.add_node("sales", sales_node)
+    # Add Nodes (sync for app.invoke, async twins for app.ainvoke in the API server), each timed as node.<name>
+    nodes = {
+        "router": (router_node, arouter_node),
+        "collector": (collector_node, acollector_node),
+        "analyst": (analyst_node, aanalyst_node),
+        "sales": (sales_node, asales_node),
+    }
+    for name, (func, afunc) in nodes.items():
+        workflow.add_node(name, RunnableLambda(traced(f"node.{name}", func), afunc=traced(f"node.{name}", afunc), name=name))
 
     # Entry Point
     workflow.set_entry_point("router")
@@ -48,4 +57,5 @@ def create_graph():
     workflow.add_conditional_edges("sales", route_sales, {"analyst": "analyst", END: END})
 
 
-    return workflow.compile()
+    # With a checkpointer the state of each conversation is stored per thread_id
+    return workflow.compile(checkpointer=checkpointer)